@@ -0,0 +1,250 @@
+"""
+Divoom Times Gate asyncio client.
+Same commands as divoom_client's send_command / send_to_screen / send_animation,
+but non-blocking, so one process can drive several Times Gates at once.
+
+Each AsyncDivoomClient keeps a small pool of keep-alive connections and a
+per-device concurrency limit; fan_out() pushes a layout to N devices
+concurrently. Within one device uploads go out one after another, as in
+the sync path: the device only handles one PicID's sequential PicOffsets
+at a time. Test offline against fake_device.FakeDevice.
+"""
+
+import asyncio
+import json
+import time
+
+from divoom_client import (
+    SIZE, FlowController, _as_picdata, command_ok, new_pic_id, lcd_array,
+    screen_label, screen_list,
+)
+
+
+class AsyncDivoomClient:
+    """asyncio client for one Times Gate.
+
+    concurrency - max commands in flight to this device at once; above 1 the
+                  flow controller's gap is taken before earlier replies
+                  are observed, so pacing is only exact at the default
+    timeout     - per-command timeout in seconds
+    flow        - FlowController pacing the commands; None sends back to back
+    """
+
+    def __init__(self, ip, concurrency=1, timeout=8, flow=True):
+        self.ip = ip
+        self.flow = FlowController() if flow is True else flow
+        host, _, port = ip.partition(":")
+        self.host = host
+        self.port = int(port or 80)
+        self.timeout = timeout
+        self._limit = asyncio.Semaphore(concurrency)
+        self._idle = []
+
+    async def _open(self):
+        return await asyncio.open_connection(self.host, self.port)
+
+    async def _roundtrip(self, conn, body):
+        reader, writer = conn
+        writer.write(
+            f"POST /post HTTP/1.1\r\n"
+            f"Host: {self.ip}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: keep-alive\r\n\r\n".encode("ascii") + body
+        )
+        await writer.drain()
+
+        status = await reader.readline()
+        if not status:
+            raise ConnectionResetError("device closed the connection")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if "content-length" in headers:
+            data = await reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            data = b"".join(chunks)
+        else:
+            data = await reader.read()
+            keep_alive = False
+        return json.loads(data), keep_alive
+
+    async def _request(self, body):
+        reused = bool(self._idle)
+        conn = self._idle.pop() if reused else await self._open()
+        try:
+            result, keep_alive = await self._roundtrip(conn, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            conn[1].close()
+            if not reused:
+                raise
+            # Idle keep-alive connection went stale; retry once on a fresh one
+            conn = await self._open()
+            result, keep_alive = await self._roundtrip(conn, body)
+        except BaseException:
+            conn[1].close()
+            raise
+        if keep_alive:
+            self._idle.append(conn)
+        else:
+            conn[1].close()
+        return result
+
+    async def send_command(self, payload):
+        """POST one command to the device. Returns the JSON reply or None."""
+        body = json.dumps(payload).encode("utf-8")
+        async with self._limit:
+            if self.flow:
+                await asyncio.sleep(self.flow.delay())
+            start = time.monotonic()
+            try:
+                data = await asyncio.wait_for(self._request(body), self.timeout)
+                print(f"  [{self.ip}] -> {data}")
+            except Exception as e:
+                print(f"  [{self.ip}] -> Error: {e!r}")
+                data = None
+            if self.flow:
+                self.flow.observe(time.monotonic() - start, command_ok(data))
+            return data
+
+    async def send_to_screen(self, screen_id, img, pic_id=None):
+        lcd = lcd_array(screen_id)
+        if pic_id is None:
+            pic_id = new_pic_id(screen_id)
+        payload = {
+            "Command": "Draw/SendHttpGif",
+            "LcdArray": lcd,
+            "PicNum": 1,
+            "PicWidth": SIZE,
+            "PicOffset": 0,
+            "PicID": pic_id,
+            "PicSpeed": 1000,
+            "PicData": await asyncio.to_thread(_as_picdata, img),
+        }
+        print(f"[{self.ip}] Sending to {screen_label(screen_id)}...")
+        return await self.send_command(payload)
+
+    async def send_animation(self, screen_id, frames, speed_ms=200, pic_id=None,
+                             retries=3, backoff=0.5, restarts=1):
+        """Upload frames (PIL images or PicData strings) as one transaction.
+
+        Same retry/restart rules and result dict as divoom_client.send_animation.
+        """
+        lcd = lcd_array(screen_id)
+        if pic_id is None:
+            pic_id = new_pic_id(screen_id, animated=True)
+        picdata = [await asyncio.to_thread(_as_picdata, frame) for frame in frames]
+        replies = [None] * len(picdata)
+        resent = restarted = 0
+
+        async def post(offset):
+            payload = {
+                "Command": "Draw/SendHttpGif",
+                "LcdArray": lcd,
+                "PicNum": len(picdata),
+                "PicWidth": SIZE,
+                "PicOffset": offset,
+                "PicID": pic_id,
+                "PicSpeed": speed_ms,
+                "PicData": picdata[offset],
+            }
+            replies[offset] = await self.send_command(payload)
+
+        def missing():
+            return [i for i, reply in enumerate(replies) if not command_ok(reply)]
+
+        print(f"[{self.ip}] Sending {len(picdata)}-frame animation to "
+              f"{screen_label(screen_id)}...")
+        for offset in range(len(picdata)):
+            await post(offset)
+        while True:
+            for attempt in range(retries):
+                failed = missing()
+                if not failed:
+                    break
+                await asyncio.sleep(backoff * 2 ** attempt)
+                for offset in failed:
+                    await post(offset)
+                resent += len(failed)
+            failed = missing()
+            if not failed or restarted >= restarts:
+                break
+            restarted += 1
+            pic_id = max(new_pic_id(screen_id, animated=True), pic_id + 1)
+            for offset in range(len(picdata)):
+                await post(offset)
+            resent += len(picdata)
+        return {
+            "ok": not failed, "pic_id": pic_id, "frames": len(picdata), "failed": failed,
+            "resent": resent, "restarts": restarted, "replies": replies,
+        }
+
+    async def apply_layout(self, layout, reset=True):
+        """Send a layout of (screen_id, frames, speed_ms) entries.
+
+        screen_id may be a list of screens sharing the same frames; they get
+        one multi-screen upload. Single-frame entries go out as static
+        images. Entries are sent one after another, so two animations
+        never interleave their PicOffsets on the device; the reset is
+        skipped for an empty layout.
+        Returns [{"screens", "pic_id", "ok"}] per entry.
+        """
+        if not layout:
+            return []
+        if reset:
+            await self.send_command({"Command": "Draw/ResetHttpGifId"})
+
+        async def send(screen_id, frames, speed_ms):
+            if len(frames) == 1:
+                pic_id = new_pic_id(screen_id)
+                ok = command_ok(await self.send_to_screen(screen_id, frames[0], pic_id))
+            else:
+                result = await self.send_animation(screen_id, frames, speed_ms)
+                ok, pic_id = result["ok"], result["pic_id"]
+            return {"screens": screen_list(screen_id), "pic_id": pic_id, "ok": ok}
+
+        return [await send(*entry) for entry in layout]
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+async def fan_out(ips, layout, concurrency=1, reset=True):
+    """Apply a layout to every device in ips at once (each device in order).
+
+    layout is a list of (screen_id or [screen_ids], frames, speed_ms), or a dict of such
+    lists keyed by ip when devices need different screens. Frames should
+    already be PicData strings so each device does not re-encode them.
+    Returns {ip: per-screen results}.
+    """
+    clients = [AsyncDivoomClient(ip, concurrency) for ip in ips]
+    layouts = layout if isinstance(layout, dict) else {ip: layout for ip in ips}
+    try:
+        results = await asyncio.gather(
+            *(client.apply_layout(layouts.get(client.ip, []), reset)
+              for client in clients))
+    finally:
+        await asyncio.gather(*(client.close() for client in clients))
+    return dict(zip(ips, results))
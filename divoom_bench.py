@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Divoom Times Gate benchmarks.
+
+Usage:
+    python divoom_bench.py all [--out bench.json]
+    python divoom_bench.py generators [--frames 1,10,20,40] [--frame-jobs N]
+    python divoom_bench.py encode [--repeat N]
+    python divoom_bench.py send [--latency S]
+    python divoom_bench.py startup [--budget-ms MS]
+    python divoom_bench.py flow [--frames 40] [--min-interval S]
+    python divoom_bench.py compare <old.json> <new.json>
+
+Every run can write its results to JSON (--out) so runs from different
+commits can be diffed with `compare`. Transmission is measured against a
+local fake_device.FakeDevice, never real hardware. `startup` exits 1 when a
+cheap CLI command goes over its time budget or imports PIL/NumPy.
+"""
+
+import sys
+import os
+import argparse
+import base64
+import contextlib
+import io
+import json
+import platform
+import statistics
+import subprocess
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import PIL
+from divoom_erik import (
+    SIZE, image_to_picdata,
+    make_screen_neon, make_screen_arcade, make_screen_gold,
+    make_screen_matrix, make_screen_fire,
+)
+from divoom_client import DivoomClient, FlowController, send_animation
+import divoom_fonts
+from fake_device import FakeDevice
+
+GENERATORS = {
+    "synthwave": (make_screen_neon, False),
+    "nebula": (make_screen_arcade, False),
+    "gold": (make_screen_gold, False),
+    "matrix": (make_screen_matrix, True),
+    "fire": (make_screen_fire, True),
+}
+
+
+def render(name, num_frames=10, workers=None):
+    make, animated = GENERATORS[name]
+    return make(num_frames, workers) if animated else [make()]
+
+
+def theme_frames():
+    """One representative set of frames per theme."""
+    return {name: render(name) for name in GENERATORS}
+
+
+def best_of(fn, repeat):
+    """Fastest wall-clock time of repeat calls to fn, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# Run by cold_run() in a fresh interpreter: prints how long the statement
+# took and how far the peak RSS rose while running it, past what imports and
+# setup reached (null where the platform cannot tell)
+_COLD_CHILD = """
+import json, sys, time
+sys.path.insert(0, {here!r})
+import divoom_bench as b
+
+def peak():
+    # Linux carries ru_maxrss over exec (so it starts at the parent's
+    # peak); VmHWM is this process image's own
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+{setup}
+before = peak()
+start = time.perf_counter()
+{stmt}
+seconds = time.perf_counter() - start
+after = peak()
+print(json.dumps([seconds, None if before is None else after - before]))
+"""
+
+
+def cold_run(stmt, setup="", repeat=1):
+    """Time and extra peak RSS of stmt (Python source) in fresh interpreters.
+
+    A one-shot CLI run starts with empty scene, font and lookup-table
+    caches, and tracemalloc cannot see Pillow's C-side image buffers, so
+    each of repeat runs gets its own interpreter. setup runs first and is
+    not counted; divoom_bench is importable as b. Returns the best
+    (seconds, peak_rss_bytes); the peak is None where it cannot be read.
+    """
+    code = _COLD_CHILD.format(here=HERE, setup=setup, stmt=stmt)
+    runs = []
+    for _ in range(max(1, repeat)):
+        proc = subprocess.run([sys.executable, "-c", code], cwd=HERE,
+                              capture_output=True, text=True, check=True)
+        runs.append(json.loads(proc.stdout.splitlines()[-1]))
+    peaks = [peak for _, peak in runs if peak is not None]
+    return min(seconds for seconds, _ in runs), min(peaks) if peaks else None
+
+
+def _kb(nbytes):
+    return "n/a" if nbytes is None else f"{nbytes / 1024:.0f}KB"
+
+
+def legacy_picdata(img):
+    """The original encode path: unconditional convert + resize, fresh BytesIO."""
+    img = img.convert("RGB").resize((SIZE, SIZE))
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=90)
+    return base64.b64encode(buf.getvalue()).decode("utf-8")
+
+
+def per_frame_us(encode, frames, repeat):
+    """Best-of-repeat mean encode time per frame, in microseconds."""
+    return best_of(lambda: [encode(f) for f in frames], repeat) / len(frames) * 1e6
+
+
+def bench_generators(frame_counts, repeat, workers=None):
+    """Cold (fresh process, as the CLI runs) and warm (caches filled) render times."""
+    results = {}
+    print(f"{'theme':12s} {'frames':>6s} {'cold':>9s} {'per frame':>10s} "
+          f"{'warm':>9s} {'per frame':>10s} {'peak RSS':>10s}")
+    for name, (_, animated) in GENERATORS.items():
+        for n in frame_counts if animated else [1]:
+            cold, peak = cold_run(f"b.render({name!r}, {n}, {workers!r})", repeat=repeat)
+            render(name, n, workers)
+            warm = best_of(lambda: render(name, n, workers), repeat)
+            results[f"{name}/{n}"] = {
+                "theme": name, "frames": n, "workers": workers,
+                "cold_seconds": cold, "cold_per_frame_ms": cold / n * 1e3,
+                "seconds": warm, "per_frame_ms": warm / n * 1e3, "peak_rss_bytes": peak,
+            }
+            print(f"{name:12s} {n:6d} {cold * 1e3:7.1f}ms {cold / n * 1e3:8.2f}ms "
+                  f"{warm * 1e3:7.1f}ms {warm / n * 1e3:8.2f}ms {_kb(peak):>10s}")
+    return results
+
+
+def bench_encode(repeat):
+    results = {}
+    print(f"{'theme':12s} {'legacy':>9s} {'current':>9s} {'speedup':>8s} "
+          f"{'frames/s':>9s} {'mean size':>10s} {'max size':>9s}")
+    for name, frames in theme_frames().items():
+        before = per_frame_us(legacy_picdata, frames, repeat)
+        after = per_frame_us(image_to_picdata, frames, repeat)
+        sizes = [len(image_to_picdata(f)) for f in frames]
+        results[name] = {
+            "legacy_us": before, "per_frame_us": after,
+            "frames_per_s": 1e6 / after,
+            "mean_bytes": statistics.mean(sizes), "max_bytes": max(sizes),
+            "peak_rss_bytes": cold_run("[b.image_to_picdata(f) for f in frames]",
+                                       setup=f"frames = b.render({name!r})")[1],
+        }
+        print(f"{name:12s} {before:7.0f}us {after:7.0f}us {before / after:7.2f}x "
+              f"{1e6 / after:9.0f} {statistics.mean(sizes):9.0f}B {max(sizes):8d}B")
+    return results
+
+
+def bench_send(latency):
+    """Upload every theme to a local fake device and time it."""
+    results = {}
+    print(f"{'theme':12s} {'frames':>6s} {'time':>9s} {'per frame':>10s} {'conns':>6s}")
+    with FakeDevice(latency=latency) as device:
+        client = DivoomClient(device.ip)
+        for name, frames in theme_frames().items():
+            picdata = [image_to_picdata(f) for f in frames]
+            device.connections.clear()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                send_animation(0, picdata, client=client)
+            seconds = time.perf_counter() - start
+            results[name] = {
+                "frames": len(frames), "seconds": seconds,
+                "per_frame_ms": seconds / len(frames) * 1e3,
+                "connections": len(device.connections),
+            }
+            print(f"{name:12s} {len(frames):6d} {seconds * 1e3:7.1f}ms "
+                  f"{seconds / len(frames) * 1e3:8.2f}ms {len(device.connections):6d}")
+        client.close()
+    return results
+
+
+def bench_flow(num_frames, latency, min_interval):
+    """Upload one animation to an easily overloaded fake device, paced and unpaced.
+
+    The device errors on commands sent within min_interval of its previous
+    reply; flow control should learn a gap that avoids that. failed counts
+    rejected commands, resent the frames send_animation had to send again.
+    """
+    frames = [image_to_picdata(f) for f in render("fire", num_frames)]
+    results = {}
+    print(f"{num_frames} frames, device latency {latency * 1e3:.0f}ms, "
+          f"overloads under {min_interval * 1e3:.0f}ms between commands\n")
+    print(f"{'pacing':8s} {'time':>9s} {'failed':>7s} {'resent':>7s} {'complete':>9s} "
+          f"{'final gap':>10s}")
+    for name, flow in (("none", None), ("adaptive", FlowController())):
+        with FakeDevice(latency=latency, min_interval=min_interval) as device:
+            client = DivoomClient(device.ip, flow=flow)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                upload = send_animation(0, frames, client=client, backoff=0.1, restarts=0)
+            seconds = time.perf_counter() - start
+            client.close()
+        gap_ms = flow.gap * 1e3 if flow else 0.0
+        results[name] = {"seconds": seconds, "failed": device.overloads,
+                         "resent": upload["resent"], "complete": upload["ok"],
+                         "gap_ms": gap_ms}
+        print(f"{name:8s} {seconds * 1e3:7.0f}ms {device.overloads:7d} {upload['resent']:7d} "
+              f"{'yes' if upload['ok'] else 'no':>9s} {gap_ms:8.0f}ms")
+    return results
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Cheap commands: argv after the interpreter, and modules they must not import
+STARTUP_CASES = {
+    "list": ([os.path.join(HERE, "divoom_themes.py"), "list"], ("PIL", "numpy")),
+    "brightness": (["-c", "import divoom_themes, divoom_client"], ("PIL", "numpy")),
+    "daemon client": (["-c", "import divoom_daemon"], ("PIL", "numpy", "requests")),
+    "bundle play": (["-c", "import divoom_bundle, divoom_state, divoom_client"],
+                    ("PIL", "numpy")),
+}
+
+
+def import_times(argv):
+    """Parse `python -X importtime` for argv: {module: cumulative us}, top level only."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", *argv], cwd=HERE,
+                          capture_output=True, text=True)
+    modules, top = set(), {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        modules.add(name.strip().split(".")[0])
+        if not name[1:].startswith(" "):
+            top[name.strip()] = int(cumulative)
+    return modules, top
+
+
+def bench_startup(repeat, budget_ms):
+    """Wall-clock start-up of cheap commands, over a bare interpreter start."""
+    results = {}
+    base = best_of(lambda: subprocess.run([sys.executable, "-c", "pass"], cwd=HERE),
+                   repeat)
+    _, base_top = import_times(["-c", "pass"])
+    print(f"bare interpreter {base * 1e3:.1f}ms; budget {budget_ms:.0f}ms on top of it\n")
+    print(f"{'command':14s} {'startup':>9s} {'imports':>9s}  slowest imports")
+    for name, (argv, forbidden) in STARTUP_CASES.items():
+        seconds = best_of(lambda: subprocess.run(
+            [sys.executable, *argv], cwd=HERE, stdout=subprocess.DEVNULL), repeat)
+        modules, top = import_times(argv)
+        top = {m: us for m, us in top.items() if m not in base_top}
+        bad = sorted(set(forbidden) & modules)
+        slowest = sorted(top.items(), key=lambda kv: -kv[1])[:3]
+        extra_ms = (seconds - base) * 1e3
+        results[name] = {
+            "seconds": seconds, "extra_ms": extra_ms,
+            "import_ms": sum(top.values()) / 1e3, "forbidden": bad,
+            "over_budget": extra_ms > budget_ms or bool(bad),
+        }
+        flag = "  <-- over budget" if extra_ms > budget_ms else ""
+        flag += f"  <-- imports {', '.join(bad)}" if bad else ""
+        print(f"{name:14s} {extra_ms:7.1f}ms {sum(top.values()) / 1e3:7.1f}ms  "
+              + ", ".join(f"{m} {us / 1e3:.0f}ms" for m, us in slowest) + flag)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=HERE,
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write_results(path, results):
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"env": environment(), "results": results}, f, indent=2)
+        print(f"\nWrote {path}")
+
+
+def _frame_counts(text):
+    return [int(n) for n in text.split(",")]
+
+
+def cmd_generators(args):
+    write_results(args.out, {"generators": bench_generators(
+        _frame_counts(args.frames), args.repeat, args.frame_jobs)})
+
+
+def cmd_encode(args):
+    write_results(args.out, {"encode": bench_encode(args.repeat)})
+
+
+def cmd_send(args):
+    write_results(args.out, {"send": bench_send(args.latency)})
+
+
+def cmd_startup(args):
+    results = bench_startup(args.repeat, args.budget_ms)
+    write_results(args.out, {"startup": results})
+    failed = [name for name, r in results.items() if r["over_budget"]]
+    if failed:
+        print(f"\nStartup budget exceeded: {', '.join(failed)}")
+        sys.exit(1)
+
+
+def cmd_flow(args):
+    write_results(args.out, {"flow": bench_flow(args.frames, args.latency,
+                                                args.min_interval)})
+
+
+def cmd_all(args):
+    print("== generators ==")
+    results = {"generators": bench_generators(_frame_counts(args.frames), args.repeat,
+                                              args.frame_jobs)}
+    print("\n== encode ==")
+    results["encode"] = bench_encode(args.repeat)
+    print("\n== send ==")
+    results["send"] = bench_send(args.latency)
+    results["fonts"] = divoom_fonts.stats()
+    write_results(args.out, results)
+
+
+def _flatten(tree, prefix=""):
+    for key, value in tree.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, path + ".")
+        elif isinstance(value, (int, float)):
+            yield path, value
+
+
+def cmd_compare(args):
+    """Show the change of every shared timing/memory figure between two runs."""
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"old: {old['env'].get('commit')}  new: {new['env'].get('commit')}")
+    old_vals = dict(_flatten(old["results"]))
+    regressions = 0
+    for path, value in _flatten(new["results"]):
+        if path not in old_vals or not old_vals[path]:
+            continue
+        change = (value - old_vals[path]) / old_vals[path] * 100
+        # Only time and memory figures count as regressions
+        worse = change > args.threshold and path.rsplit(".", 1)[-1] in (
+            "seconds", "per_frame_ms", "cold_seconds", "cold_per_frame_ms",
+            "per_frame_us", "peak_rss_bytes")
+        regressions += worse
+        flag = "  <-- regression" if worse else ""
+        print(f"  {path:45s} {old_vals[path]:12.4g} -> {value:12.4g} {change:+7.1f}%{flag}")
+    if regressions:
+        print(f"\n{regressions} regressions over {args.threshold:.0f}%")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Divoom Times Gate benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(p, frames=False, send=False):
+        p.add_argument("--out", default=None, help="Write results to this JSON file")
+        p.add_argument("--repeat", type=int, default=5, help="Best-of repeat count")
+        if frames:
+            p.add_argument("--frames", default="1,10,20,40",
+                           help="Comma-separated frame counts for animated themes")
+            p.add_argument("--frame-jobs", type=int, default=None,
+                           help="Processes rendering animated frames (default: serial)")
+        if send:
+            p.add_argument("--latency", type=float, default=0.0,
+                           help="Simulated device latency per command, in seconds")
+
+    add_common(sub.add_parser("all", help="Run every benchmark"), frames=True, send=True)
+    add_common(sub.add_parser("generators", help="Theme render time and peak memory"),
+               frames=True)
+    add_common(sub.add_parser("encode", help="Per-frame JPEG/base64 encode cost and size"))
+    add_common(sub.add_parser("send", help="Upload throughput to a local fake device"),
+               send=True)
+    p_flow = sub.add_parser("flow", help="Adaptive pacing against an overloaded fake device")
+    add_common(p_flow, send=True)
+    p_flow.add_argument("--frames", type=int, default=40, help="Animation length")
+    p_flow.add_argument("--min-interval", type=float, default=0.05,
+                        help="Fake device errors on commands closer than this, in seconds")
+    p_start = sub.add_parser("startup", help="Start-up time budget for cheap CLI commands")
+    add_common(p_start)
+    p_start.add_argument("--budget-ms", type=float, default=200.0,
+                         help="Allowed start-up time over a bare interpreter, in ms")
+
+    p_cmp = sub.add_parser("compare", help="Compare two JSON result files")
+    p_cmp.add_argument("old")
+    p_cmp.add_argument("new")
+    p_cmp.add_argument("--threshold", type=float, default=10.0,
+                       help="Percent slowdown that counts as a regression")
+
+    args = parser.parse_args()
+    commands = {
+        "all": cmd_all,
+        "generators": cmd_generators,
+        "encode": cmd_encode,
+        "send": cmd_send,
+        "startup": cmd_startup,
+        "flow": cmd_flow,
+        "compare": cmd_compare,
+    }
+    commands[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
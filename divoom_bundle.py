@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Divoom Times Gate animation bundles.
+A bundle is one theme's encoded frames in a single file, ready to send: the
+JPEG bytes are stored raw (not base64) behind a small header and a frame
+offset index. Bundles are memory-mapped on load and each frame is a
+zero-copy memoryview of the mapping, so playing one streams the frames to
+send_animation without rendering, decoding or holding them all in memory.
+
+Layout (little-endian):
+    header   magic b"DVMB", version u16, width u16, height u16,
+             label length u16, PicSpeed u32 (0 = still image), frame count u32
+    label    UTF-8 theme name
+    index    (offset u32, length u32) per frame, offsets from file start
+    frames   JPEG bytes
+
+Usage:
+    python divoom_bundle.py build <theme> [<theme>...] [--out DIR]
+    python divoom_bundle.py build all [--out DIR]
+    python divoom_bundle.py info <bundle.dvb> [<bundle.dvb>...]
+    python divoom_bundle.py play <bundle.dvb> <screen> [<screen>...] [--force]
+"""
+
+import sys
+import os
+import argparse
+import base64
+import mmap
+import struct
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MAGIC = b"DVMB"
+VERSION = 1
+EXTENSION = ".dvb"
+HEADER = struct.Struct("<4sHHHHII")
+INDEX_ENTRY = struct.Struct("<II")
+
+
+class BundleError(ValueError):
+    """The file is not a readable bundle."""
+
+
+def jpeg_bytes(frame):
+    """Raw JPEG bytes for a PicData string, a PIL image or bytes-like data."""
+    if isinstance(frame, str):
+        return base64.b64decode(frame)
+    if isinstance(frame, (bytes, bytearray, memoryview)):
+        return bytes(frame)
+    from divoom_client import _as_picdata
+    return base64.b64decode(_as_picdata(frame))
+
+
+def write_bundle(path, frames, speed_ms=None, label="", size=(128, 128)):
+    """Write frames (PicData strings, PIL images or JPEG bytes) as a bundle.
+
+    speed_ms is the animation's PicSpeed, None for a still image. The file
+    is written to a temporary name and renamed into place. Returns path.
+    """
+    data = [jpeg_bytes(frame) for frame in frames]
+    if not data:
+        raise ValueError("a bundle needs at least one frame")
+    name = label.encode("utf-8")
+    offset = HEADER.size + len(name) + INDEX_ENTRY.size * len(data)
+    index = []
+    for frame in data:
+        index.append(INDEX_ENTRY.pack(offset, len(frame)))
+        offset += len(frame)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".bundle-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, size[0], size[1], len(name),
+                                speed_ms or 0, len(data)))
+            f.write(name)
+            f.writelines(index)
+            f.writelines(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return path
+
+
+class Bundle:
+    """A memory-mapped bundle. Frames are memoryviews of raw JPEG bytes.
+
+    Use as a context manager, or call close(). The mapping stays open while
+    any frame view is still referenced.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            # Also rules out empty files, which mmap refuses to map
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise BundleError(f"{path}: too short for a bundle header")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse()
+        except BaseException:
+            self._map.close()
+            raise
+
+    def _parse(self):
+        magic, version, width, height, name_len, speed_ms, count = \
+            HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise BundleError(f"{self.path}: not a bundle (magic {magic!r})")
+        if version != VERSION:
+            raise BundleError(f"{self.path}: unsupported bundle version {version}")
+        start = HEADER.size + name_len
+        end = start + INDEX_ENTRY.size * count
+        if end > len(self._map):
+            raise BundleError(f"{self.path}: truncated frame index")
+        self.size = (width, height)
+        self.speed_ms = speed_ms or None
+        self.label = self._map[HEADER.size:start].decode("utf-8")
+        self._index = list(INDEX_ENTRY.iter_unpack(self._map[start:end]))
+        for offset, length in self._index:
+            if offset + length > len(self._map):
+                raise BundleError(f"{self.path}: frame data past end of file")
+        self._view = memoryview(self._map)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __getitem__(self, i):
+        offset, length = self._index[i]
+        return self._view[offset:offset + length]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def animated(self):
+        return self.speed_ms is not None
+
+    def picdata(self):
+        """Yield each frame as a PicData string, one at a time."""
+        for frame in self:
+            yield base64.b64encode(frame).decode("ascii")
+
+    def close(self):
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # Frame views are still alive; the mapping closes when they go
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def build_theme(theme_name, path, cache=None, encoding=None):
+    """Render (or reuse the cached render of) a theme and write it as a bundle."""
+    from divoom_registry import THEMES
+    from divoom_themes import render_theme
+
+    info = THEMES[theme_name]
+    picdata = render_theme(theme_name, cache, encoding)
+    speed_ms = info.get("speed_ms") if info["animated"] else None
+    return write_bundle(path, picdata, speed_ms, label=theme_name)
+
+
+def play_bundle(bundle, screens, client=None):
+    """Send a bundle to a screen or screens. Returns (ok, pic_id)."""
+    from divoom_client import command_ok, new_pic_id, send_to_screen, send_animation
+
+    pic_id = new_pic_id(screens, bundle.animated)
+    if bundle.animated:
+        result = send_animation(screens, bundle, speed_ms=bundle.speed_ms,
+                                client=client, pic_id=pic_id)
+        return result["ok"], result["pic_id"]
+    return command_ok(send_to_screen(screens, bundle[0], client, pic_id=pic_id)), pic_id
+
+
+# ============================================================
+# CLI
+# ============================================================
+
+def cmd_build(args):
+    from divoom_registry import THEMES, resolve_theme
+    from divoom_cache import FrameCache
+
+    names = list(THEMES) if [t.lower() for t in args.themes] == ["all"] else args.themes
+    cache = None if args.no_cache else FrameCache()
+    for name in names:
+        theme = resolve_theme(name)
+        if theme is None:
+            print(f"Error: Unknown theme '{name}'")
+            print(f"Available: {', '.join(THEMES.keys())}")
+            sys.exit(1)
+        start = time.perf_counter()
+        path = build_theme(theme, os.path.join(args.out, theme + EXTENSION), cache)
+        print(f"  {theme:12s} -> {path} ({os.path.getsize(path) / 1024:.1f} KB, "
+              f"{time.perf_counter() - start:.3f}s)")
+
+
+def cmd_info(args):
+    for path in args.bundles:
+        with Bundle(path) as bundle:
+            speed = f"{bundle.speed_ms} ms/frame" if bundle.animated else "still"
+            sizes = [len(frame) for frame in bundle]
+            print(f"{path}: '{bundle.label}', {len(bundle)} frames "
+                  f"{bundle.size[0]}x{bundle.size[1]}, {speed}, "
+                  f"{sum(sizes) / 1024:.1f} KB JPEG (largest frame {max(sizes) / 1024:.1f} KB)")
+
+
+def cmd_play(args):
+    from divoom_client import DEVICE_IP, send_command
+    from divoom_state import ScreenState, content_hash
+
+    try:
+        screens = [int(s) for s in args.screens]
+    except ValueError:
+        print(f"Error: Screens must be 0-4, got {' '.join(args.screens)}")
+        sys.exit(1)
+    for screen_id in screens:
+        if not 0 <= screen_id <= 4:
+            print(f"Error: Screen must be 0-4, got {screen_id}")
+            sys.exit(1)
+    with Bundle(args.bundle) as bundle:
+        # Same hash as a theme render with the same frames, so screens already
+        # showing that theme (from apply or an earlier play) are skipped
+        digest = content_hash(bundle.picdata(), bundle.speed_ms)
+        state = ScreenState(DEVICE_IP)
+        if args.force:
+            state.forget()
+        changed = [s for s in screens if state.changed(s, digest)]
+        for screen_id in screens:
+            if screen_id not in changed:
+                print(f"Screen {screen_id} already shows '{bundle.label}', skipping")
+        if not changed:
+            return
+        send_command({"Command": "Draw/ResetHttpGifId"})
+        start = time.perf_counter()
+        ok, pic_id = play_bundle(bundle, changed)
+        for screen_id in changed:
+            if ok:
+                state.record(screen_id, digest, pic_id, bundle.label)
+            else:
+                state.forget([screen_id])
+        state.save()
+        print(f"  {len(bundle)} frames from {args.bundle} in "
+              f"{time.perf_counter() - start:.3f}s")
+    if not ok:
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Divoom Times Gate animation bundles")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Render themes into bundle files")
+    p_build.add_argument("themes", nargs="+", help="Theme names or aliases, or 'all'")
+    p_build.add_argument("--out", default=".", help="Directory to write bundles to")
+    p_build.add_argument("--no-cache", action="store_true",
+                         help="Ignore the rendered-frame cache and render from scratch")
+
+    p_info = sub.add_parser("info", help="Show what a bundle contains")
+    p_info.add_argument("bundles", nargs="+")
+
+    p_play = sub.add_parser("play", help="Send a bundle to one or more screens")
+    p_play.add_argument("bundle")
+    p_play.add_argument("screens", nargs="+", help="Screen numbers (0-4)")
+    p_play.add_argument("--force", action="store_true",
+                        help="Resend even if the screens already show this content")
+
+    args = parser.parse_args(argv)
+    commands = {"build": cmd_build, "info": cmd_info, "play": cmd_play}
+    try:
+        commands[args.command](args)
+    except (OSError, BundleError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Divoom Times Gate rendered-frame cache.
+Keeps the encoded PicData of rendered themes on disk so re-applying a theme
+skips rendering and JPEG encoding entirely.
+
+Entries are keyed by theme name, render parameters and a hash of the
+generator's module source, so editing any theme code invalidates them.
+Least recently used entries are evicted once the cache exceeds its size cap.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+CACHE_DIR = os.environ.get(
+    "DIVOOM_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "divoom_timesgate"),
+)
+MAX_BYTES = 64 * 1024 * 1024
+# PicData kept in memory by MemoryFrameCache, on top of the disk cache
+MEMORY_BYTES = 16 * 1024 * 1024
+
+
+def source_hash(func):
+    """Hash of the source of the module defining func.
+
+    The whole module is hashed rather than the function alone because the
+    generators share drawing helpers (fonts, glow text, gradients).
+    """
+    src = inspect.getsource(inspect.getmodule(func))
+    return hashlib.sha256(src.encode("utf-8")).hexdigest()[:16]
+
+
+class FrameCache:
+    """On-disk LRU cache of rendered PicData."""
+
+    def __init__(self, path=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, theme, make, **params):
+        """Cache key for a theme rendered by make() with the given params."""
+        ident = {"theme": theme, "source": source_hash(make), "params": params}
+        blob = json.dumps(ident, sort_keys=True).encode("utf-8")
+        return hashlib.sha256(blob).hexdigest()[:24]
+
+    def _entry(self, key):
+        return os.path.join(self.path, key)
+
+    def get(self, key):
+        """Return the cached PicData list for key, or None on a miss."""
+        index = os.path.join(self._entry(key), "picdata.json")
+        try:
+            with open(index, encoding="utf-8") as f:
+                picdata = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Touch the index so eviction sees this entry as recently used
+        try:
+            os.utime(index)
+        except OSError:
+            # Evicted by another process since the read; the data is still good
+            pass
+        return picdata
+
+    def put(self, key, picdata):
+        """Store a PicData list under key, then enforce the size cap."""
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=self.path)
+        try:
+            with open(os.path.join(tmp, "picdata.json"), "w", encoding="utf-8") as f:
+                json.dump(picdata, f)
+            entry = self._entry(key)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits max_bytes."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.path):
+            entry = os.path.join(self.path, name)
+            index = os.path.join(entry, "picdata.json")
+            if name.startswith("."):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry, n))
+                           for n in os.listdir(entry))
+                entries.append((os.path.getmtime(index), size, entry))
+            except OSError:
+                # Entry vanished or is half-written by another process
+                continue
+            total += size
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path, exist_ok=True)
+
+
+class MemoryFrameCache(FrameCache):
+    """FrameCache that also keeps PicData in memory, for long-running processes.
+
+    The in-memory entries are an LRU capped at memory_bytes of PicData.
+    Pickles as a plain FrameCache, so process-pool workers share the disk
+    cache without copying the in-memory entries.
+    """
+
+    def __init__(self, path=CACHE_DIR, max_bytes=MAX_BYTES, memory_bytes=MEMORY_BYTES):
+        super().__init__(path, max_bytes)
+        self.memory_bytes = memory_bytes
+        self.picdata = OrderedDict()
+        self._memory_used = 0
+
+    def get(self, key):
+        if key in self.picdata:
+            self.picdata.move_to_end(key)
+            return self.picdata[key]
+        picdata = super().get(key)
+        if picdata is not None:
+            self._remember(key, picdata)
+        return picdata
+
+    def put(self, key, picdata):
+        super().put(key, picdata)
+        self._remember(key, picdata)
+
+    def _remember(self, key, picdata):
+        if key in self.picdata:
+            self._memory_used -= _picdata_size(self.picdata.pop(key))
+        self.picdata[key] = picdata
+        self._memory_used += _picdata_size(picdata)
+        # Oldest first; the entry just added stays even if it alone is too big
+        while self._memory_used > self.memory_bytes and len(self.picdata) > 1:
+            _, old = self.picdata.popitem(last=False)
+            self._memory_used -= _picdata_size(old)
+
+    def clear(self):
+        super().clear()
+        self.picdata.clear()
+        self._memory_used = 0
+
+    def __reduce__(self):
+        return FrameCache, (self.path, self.max_bytes)
+
+
+def _picdata_size(picdata):
+    return sum(len(data) for data in picdata)
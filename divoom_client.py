@@ -0,0 +1,380 @@
+"""
+Divoom Times Gate device client.
+Holds one pooled keep-alive HTTP session per device, so a full 5-screen
+layout reuses a single connection instead of opening one per frame.
+
+Commands are paced by a FlowController: the idle gap between a reply and
+the next command shrinks while the device answers promptly and grows when
+round trips spike or the device reports errors.
+
+The upload path (send_to_screen, send_animation) lives here too. Frames
+that are already PicData or raw JPEG bytes are sent without importing PIL
+or NumPy, so pre-encoded content (e.g. divoom_bundle files) plays on the
+standard library plus requests.
+"""
+
+import base64
+import functools
+import queue
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEVICE_IP = "10.0.0.21"
+SIZE = 128
+
+
+class FlowController:
+    """AIMD pacing of device commands from measured round trips and error codes.
+
+    initial_gap - idle seconds between a reply and the next command at start
+    step        - gap removed after each prompt, successful reply
+    factor      - gap multiplier on a latency spike or error
+    min_gap     - floor for the gap; max_gap - ceiling
+    probe_after - successes in a row before retrying a gap that failed before
+
+    A round trip counts as a spike when it exceeds the smoothed RTT by four
+    deviations (as TCP's retransmit timer does) and by at least min_spike
+    seconds. After a backoff the gap does not shrink back below the gap that
+    failed until probe_after commands in a row have succeeded.
+    """
+
+    def __init__(self, initial_gap=0.05, step=0.01, factor=2.0, min_gap=0.0, max_gap=2.0,
+                 probe_after=20, min_spike=0.02):
+        self.gap = initial_gap
+        self.step = step
+        self.factor = factor
+        self.min_gap = min_gap
+        self.max_gap = max_gap
+        self.probe_after = probe_after
+        self.min_spike = min_spike
+        self.srtt = None
+        self.rttvar = 0.0
+        self.commands = 0
+        self.errors = 0
+        self.backoffs = 0
+        self._floor = min_gap
+        self._streak = 0
+        self._ready_at = 0.0
+        self._lock = threading.Lock()
+
+    def delay(self):
+        """Seconds to wait before sending the next command."""
+        return max(0.0, self._ready_at - time.monotonic())
+
+    def wait(self):
+        time.sleep(self.delay())
+
+    def observe(self, rtt, ok):
+        """Record one command's round trip and whether the device accepted it."""
+        with self._lock:
+            self.commands += 1
+            spike = (self.srtt is not None and self.commands > 3
+                     and rtt > self.srtt + max(4 * self.rttvar, self.min_spike))
+            if ok and not spike:
+                self._streak += 1
+                if self._streak % self.probe_after == 0:
+                    self._floor = max(self.min_gap, self._floor - self.step)
+                self.gap = max(self._floor, self.gap - self.step)
+            else:
+                self.errors += not ok
+                self.backoffs += 1
+                self._streak = 0
+                self._floor = min(self.max_gap, self.gap + self.step)
+                self.gap = min(self.max_gap, max(self.gap * self.factor, self.step * 3))
+            if ok:
+                if self.srtt is None:
+                    self.srtt, self.rttvar = rtt, rtt / 2
+                else:
+                    self.rttvar += (abs(self.srtt - rtt) - self.rttvar) / 4
+                    self.srtt += (rtt - self.srtt) / 8
+            self._ready_at = time.monotonic() + self.gap
+
+    def stats(self):
+        return {
+            "commands": self.commands, "errors": self.errors, "backoffs": self.backoffs,
+            "gap_ms": self.gap * 1e3,
+            "srtt_ms": self.srtt * 1e3 if self.srtt is not None else None,
+        }
+
+    def summary(self):
+        s = self.stats()
+        rtt = f"{s['srtt_ms']:.1f}ms" if s["srtt_ms"] is not None else "-"
+        return (f"flow: {s['commands']} commands, smoothed RTT {rtt}, gap {s['gap_ms']:.0f}ms, "
+                f"{s['backoffs']} backoffs, {s['errors']} errors")
+
+
+class DivoomClient:
+    """Pooled HTTP client for one Times Gate.
+
+    pool_size   - max keep-alive connections kept open to the device
+    retries     - connection/5xx retries per command (0 disables)
+    backoff     - backoff factor between retries (0.3 -> 0.3s, 0.6s, 1.2s...)
+    timeout     - default per-command timeout in seconds
+    flow        - FlowController pacing the commands; None sends back to back
+    """
+
+    def __init__(self, ip=DEVICE_IP, pool_size=2, retries=2, backoff=0.3, timeout=8,
+                 flow=True):
+        self.ip = ip
+        self.url = f"http://{ip}/post"
+        self.timeout = timeout
+        self.flow = FlowController() if flow is True else flow
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            backoff_factor=backoff,
+            status_forcelist=(500, 502, 503, 504),
+            # Device commands are plain JSON POSTs; resending one is harmless
+            allowed_methods=None,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                              max_retries=retry)
+        self.session.mount("http://", adapter)
+
+    def send_command(self, payload, timeout=None):
+        """POST one command to the device. Returns the JSON reply or None."""
+        if self.flow:
+            self.flow.wait()
+        start = time.monotonic()
+        try:
+            r = self.session.post(self.url, json=payload,
+                                  timeout=timeout or self.timeout)
+            data = r.json()
+            print(f"  -> {data}")
+        except Exception as e:
+            print(f"  -> Error: {e}")
+            data = None
+        if self.flow:
+            self.flow.observe(time.monotonic() - start, command_ok(data))
+        return data
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_client = None
+
+
+def get_client():
+    """Shared pooled client for DEVICE_IP, created on first use."""
+    global _client
+    if _client is None:
+        _client = DivoomClient(DEVICE_IP)
+    return _client
+
+
+def send_command(payload, client=None):
+    return (client or get_client()).send_command(payload)
+
+
+def command_ok(reply):
+    """True if a device reply reports success."""
+    return reply is not None and reply.get("error_code", 0) == 0
+
+
+def screen_list(screens):
+    """Normalise one screen index or an iterable of them to a sorted list."""
+    return [screens] if isinstance(screens, int) else sorted(set(screens))
+
+
+def lcd_array(screens):
+    """LcdArray mask selecting one screen or several (same content on each)."""
+    screens = screen_list(screens)
+    return [1 if i in screens else 0 for i in range(5)]
+
+
+def screen_label(screens):
+    screens = screen_list(screens)
+    if len(screens) == 1:
+        return f"screen {screens[0]}"
+    return "screens " + ",".join(str(s) for s in screens)
+
+
+def new_pic_id(screen_id, animated=False):
+    """Fresh timestamp PicID for a screen (the device caches frames by ID).
+
+    screen_id may be a list when one upload targets several screens.
+    """
+    return int(time.time()) + min(screen_list(screen_id)) + (100 if animated else 0)
+
+
+def _as_picdata(frame, **encode_opts):
+    """PicData for a frame; already-encoded PicData strings pass through.
+
+    bytes-like frames are taken as raw JPEG data (e.g. divoom_bundle frames)
+    and only base64-encoded. PIL images and RGB arrays are JPEG-encoded by
+    divoom_erik, which is only imported for them, so sending pre-encoded
+    frames needs neither PIL nor NumPy.
+    """
+    if isinstance(frame, str):
+        return frame
+    if isinstance(frame, (bytes, bytearray, memoryview)):
+        return base64.b64encode(frame).decode("ascii")
+    from divoom_erik import frame_to_picdata
+    return frame_to_picdata(frame, **encode_opts)
+
+
+def _prefetch(iterable, maxsize=2):
+    """Iterate iterable in a background thread, buffering at most maxsize items.
+
+    Exceptions raised by the source are re-raised in the consumer; closing
+    the consumer early stops the background thread.
+    """
+    q = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run():
+        try:
+            for item in iterable:
+                if not put((True, item)):
+                    return
+            put((False, None))
+        except BaseException as e:
+            put((False, e))
+
+    threading.Thread(target=run, daemon=True).start()
+    try:
+        while True:
+            ok, item = q.get()
+            if not ok:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def encode_frames(frames, queue_size=2, **encode_opts):
+    """Yield PicData for frames, rendering and encoding ahead of the consumer.
+
+    frames may be a lazy generator: it is advanced in one thread and JPEG
+    encoding runs in another, with bounded queues between the stages, so
+    while frame N is being sent frame N+1 is encoded and N+2 rendered.
+    encode_opts are passed to image_to_picdata (e.g. max_bytes, min_psnr).
+    """
+    encode = functools.partial(_as_picdata, **encode_opts)
+    return _prefetch(map(encode, _prefetch(frames, queue_size)), queue_size)
+
+
+def send_to_screen(screen_id, img, client=None, pic_id=None):
+    """Send one image. screen_id may be a list to show it on several screens."""
+    lcd = lcd_array(screen_id)
+    if pic_id is None:
+        pic_id = new_pic_id(screen_id)
+    payload = {
+        "Command": "Draw/SendHttpGif",
+        "LcdArray": lcd,
+        "PicNum": 1,
+        "PicWidth": SIZE,
+        "PicOffset": 0,
+        "PicID": pic_id,
+        "PicSpeed": 1000,
+        "PicData": _as_picdata(img),
+    }
+    print(f"Sending to {screen_label(screen_id)}...")
+    return send_command(payload, client)
+
+
+def send_animation(screen_id, frames, speed_ms=200, client=None, num_frames=None,
+                   pic_id=None, retries=3, backoff=0.5, restarts=1):
+    """Upload frames to a screen as one animation transaction.
+
+    frames may be any iterable of PIL images or PicData strings, including a
+    generator; pass num_frames when it has no len(). screen_id may be a list
+    to play the same animation on several screens with one upload.
+
+    Every PicOffset's reply is tracked. Offsets the device did not accept
+    are resent under the same PicID up to `retries` times, waiting
+    backoff, 2*backoff, ... seconds first. If some still fail, the whole
+    animation is resent under a fresh PicID, up to `restarts` times, so
+    the device is never left showing a partial PicID.
+
+    Returns {"ok", "pic_id", "frames", "failed", "resent", "restarts", "replies"}:
+    failed lists the offsets missing at the end, replies the last reply
+    per offset.
+    """
+    if num_frames is None:
+        num_frames = len(frames)
+    lcd = lcd_array(screen_id)
+    if pic_id is None:
+        pic_id = new_pic_id(screen_id, animated=True)
+    picdata, replies = [], []
+    resent = restarted = 0
+
+    def post(offset):
+        payload = {
+            "Command": "Draw/SendHttpGif",
+            "LcdArray": lcd,
+            "PicNum": num_frames,
+            "PicWidth": SIZE,
+            "PicOffset": offset,
+            "PicID": pic_id,
+            "PicSpeed": speed_ms,
+            "PicData": picdata[offset],
+        }
+        replies[offset] = send_command(payload, client)
+
+    def missing():
+        return [i for i, reply in enumerate(replies) if not command_ok(reply)]
+
+    print(f"Sending {num_frames}-frame animation to {screen_label(screen_id)}...")
+    for data in encode_frames(frames):
+        picdata.append(data)
+        replies.append(None)
+        post(len(picdata) - 1)
+
+    while True:
+        for attempt in range(retries):
+            failed = missing()
+            if not failed:
+                break
+            time.sleep(backoff * 2 ** attempt)
+            print(f"  Resending {len(failed)} failed frames (PicOffset {failed})...")
+            for offset in failed:
+                post(offset)
+            resent += len(failed)
+        failed = missing()
+        if not failed or restarted >= restarts:
+            break
+        restarted += 1
+        pic_id = max(new_pic_id(screen_id, animated=True), pic_id + 1)
+        print(f"  {len(failed)} frames still missing, restarting as PicID {pic_id}...")
+        for offset in range(len(picdata)):
+            post(offset)
+        resent += len(picdata)
+
+    if failed:
+        print(f"  Failed: {len(failed)} of {len(picdata)} frames not accepted")
+    else:
+        print(f"  Done!")
+    return {
+        "ok": not failed and len(picdata) == num_frames,
+        "pic_id": pic_id,
+        "frames": len(picdata),
+        "failed": failed,
+        "resent": resent,
+        "restarts": restarted,
+        "replies": replies,
+    }
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Divoom Times Gate daemon.
+Keeps one resident process with PIL, fonts, rendered frames and the device
+connection already loaded, and runs divoom_themes.py commands sent to it
+over a local HTTP API. The same script is also the thin client: it forwards
+its arguments to the daemon and falls back to running the command itself
+when no daemon is listening.
+
+Usage:
+    python divoom_daemon.py serve [--host 127.0.0.1] [--port 7321]
+    python divoom_daemon.py apply <theme> <screen> [<screen>...]
+    python divoom_daemon.py apply-all
+    python divoom_daemon.py brightness <0-100>
+    python divoom_daemon.py list
+    python divoom_daemon.py status
+
+API (JSON over HTTP, localhost only by default):
+    POST /run     {"argv": ["apply", "fire", "2"]} -> {"exit": 0, "output": "..."}
+    GET  /status  uptime, commands served, in-memory renders, font cache stats
+
+The client side imports only the standard library, so a forwarded command
+costs an interpreter start plus one local round trip.
+"""
+
+import sys
+import os
+import json
+import time
+import urllib.error
+import urllib.request
+
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = int(os.environ.get("DIVOOM_DAEMON_PORT", 7321))
+
+
+# ============================================================
+# Server
+# ============================================================
+
+def serve(host=DAEMON_HOST, port=DAEMON_PORT):
+    """Run the daemon until interrupted. Commands run one at a time."""
+    import contextlib
+    import io
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import divoom_fonts
+    import divoom_themes
+    from divoom_cache import MemoryFrameCache
+
+    divoom_themes.frame_cache = MemoryFrameCache()
+    stats = {"started": time.time(), "commands": 0}
+
+    def run(argv):
+        output = io.StringIO()
+        code = 0
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            try:
+                divoom_themes.main(argv)
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 1
+            except Exception as e:
+                print(f"Error: {e!r}")
+                code = 1
+        stats["commands"] += 1
+        return {"exit": code, "output": output.getvalue()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, status, data):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/status":
+                return self._reply(404, {"error": "not found"})
+            self._reply(200, {
+                "pid": os.getpid(),
+                "uptime": time.time() - stats["started"],
+                "commands": stats["commands"],
+                "cached_renders": len(divoom_themes.frame_cache.picdata),
+                "fonts": divoom_fonts.stats(),
+            })
+
+        def do_POST(self):
+            if self.path != "/run":
+                return self._reply(404, {"error": "not found"})
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                argv = json.loads(self.rfile.read(length))["argv"]
+            except (ValueError, KeyError, TypeError):
+                argv = None
+            if not (isinstance(argv, list) and all(isinstance(arg, str) for arg in argv)):
+                return self._reply(400, {"error": "expected {\"argv\": [...]}"})
+            start = time.perf_counter()
+            result = run(argv)
+            print(f"{' '.join(argv)} -> exit {result['exit']} "
+                  f"({time.perf_counter() - start:.3f}s)")
+            self._reply(200, result)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    server = HTTPServer((host, port), Handler)
+    print(f"Divoom daemon listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# ============================================================
+# Client
+# ============================================================
+
+def request(method, path, data=None, host=DAEMON_HOST, port=DAEMON_PORT, timeout=120):
+    """One JSON request to the daemon. Raises OSError if it is not running."""
+    body = json.dumps(data).encode("utf-8") if data is not None else None
+    req = urllib.request.Request(
+        f"http://{host}:{port}{path}", data=body, method=method,
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(req, timeout=timeout) as r:
+        return json.loads(r.read())
+
+
+def run_command(argv):
+    """Run a divoom_themes command in the daemon, or in-process if none is up.
+
+    Returns the exit code.
+    """
+    try:
+        result = request("POST", "/run", {"argv": argv})
+    except urllib.error.HTTPError as e:
+        print(f"Error: daemon replied {e.code}")
+        return 1
+    except OSError as e:
+        # Only fall back when nothing is listening; a timeout means the daemon
+        # may still be sending, and running the command again would race it
+        if not isinstance(getattr(e, "reason", e), ConnectionRefusedError):
+            print(f"Error: daemon request failed: {e}")
+            return 1
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import divoom_themes
+        try:
+            divoom_themes.main(argv)
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else 1
+        return 0
+    print(result["output"], end="")
+    return result["exit"]
+
+
+def main():
+    argv = sys.argv[1:]
+    if argv[:1] == ["serve"]:
+        import argparse
+        parser = argparse.ArgumentParser(description="Divoom Times Gate daemon")
+        parser.add_argument("serve")
+        parser.add_argument("--host", default=DAEMON_HOST)
+        parser.add_argument("--port", type=int, default=DAEMON_PORT)
+        args = parser.parse_args(argv)
+        serve(args.host, args.port)
+    elif argv[:1] == ["status"]:
+        try:
+            status = request("GET", "/status", timeout=5)
+        except OSError:
+            print("Divoom daemon is not running")
+            sys.exit(1)
+        print(f"Divoom daemon pid {status['pid']}, up {status['uptime']:.0f}s, "
+              f"{status['commands']} commands served, "
+              f"{status['cached_renders']} renders in memory, "
+              f"{status['fonts']['loaded']} fonts loaded "
+              f"({status['fonts']['hits']} cache hits)")
+    else:
+        sys.exit(run_command(argv))
+
+
+if __name__ == "__main__":
+    main()
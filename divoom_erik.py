@@ -5,107 +5,334 @@ Each screen gets a unique fun style with rich, detailed backgrounds!
 Key specs: 128x128 per screen, JPEG-encoded PicData, timestamp PicIDs.
 """
 
-import requests
 import base64
+import functools
 import time
 import io
 import math
 import random
-from PIL import Image, ImageDraw, ImageFont, ImageChops
-
-DEVICE_IP = "10.0.0.21"
-URL = f"http://{DEVICE_IP}/post"
-SIZE = 128
-
-
-def send_command(payload):
-    try:
-        r = requests.post(URL, json=payload, timeout=8)
-        print(f"  -> {r.json()}")
-        return r.json()
-    except Exception as e:
-        print(f"  -> Error: {e}")
-        return None
-
-
-def image_to_picdata(img):
-    """Convert PIL Image to base64 JPEG for Times Gate."""
-    img = img.convert("RGB").resize((SIZE, SIZE))
-    buf = io.BytesIO()
-    img.save(buf, format="JPEG", quality=90)
-    return base64.b64encode(buf.getvalue()).decode("utf-8")
-
-
-def send_to_screen(screen_id, img):
-    lcd = [0] * 5
-    lcd[screen_id] = 1
-    pic_id = int(time.time()) + screen_id
-    payload = {
-        "Command": "Draw/SendHttpGif",
-        "LcdArray": lcd,
-        "PicNum": 1,
-        "PicWidth": SIZE,
-        "PicOffset": 0,
-        "PicID": pic_id,
-        "PicSpeed": 1000,
-        "PicData": image_to_picdata(img),
-    }
-    print(f"Sending to screen {screen_id}...")
-    return send_command(payload)
-
-
-def send_animation(screen_id, frames, speed_ms=200):
-    lcd = [0] * 5
-    lcd[screen_id] = 1
-    pic_id = int(time.time()) + screen_id + 100
-    print(f"Sending {len(frames)}-frame animation to screen {screen_id}...")
-    for i, frame in enumerate(frames):
-        payload = {
-            "Command": "Draw/SendHttpGif",
-            "LcdArray": lcd,
-            "PicNum": len(frames),
-            "PicWidth": SIZE,
-            "PicOffset": i,
-            "PicID": pic_id,
-            "PicSpeed": speed_ms,
-            "PicData": image_to_picdata(frame),
-        }
-        send_command(payload)
-    print(f"  Done!")
-
-
-def get_font(name, size):
-    """Try to load a Windows font by name."""
-    paths = {
-        "bold": ["C:/Windows/Fonts/arialbd.ttf", "C:/Windows/Fonts/calibrib.ttf"],
-        "regular": ["C:/Windows/Fonts/arial.ttf", "C:/Windows/Fonts/calibri.ttf"],
-        "script": [
-            "C:/Windows/Fonts/MISTRAL.TTF",
-            "C:/Windows/Fonts/PRISTINA.TTF",
-            "C:/Windows/Fonts/segoesc.ttf",
-            "C:/Windows/Fonts/arial.ttf",
-        ],
-        "impact": ["C:/Windows/Fonts/impact.ttf", "C:/Windows/Fonts/arialbd.ttf"],
-    }
-    for p in paths.get(name, paths["regular"]):
-        try:
-            return ImageFont.truetype(p, size)
-        except:
-            pass
-    return ImageFont.load_default()
+import sys
+import threading
+import numpy as np
+from PIL import Image, ImageDraw
+from divoom_client import (
+    DEVICE_IP, SIZE, get_client, send_command, command_ok, new_pic_id,
+    send_to_screen, send_animation,
+)
+from divoom_fonts import get_font
+from divoom_state import ScreenState, content_hash
+
+
+def image_to_picdata(img, quality=90, max_bytes=None, min_psnr=None):
+    """Convert PIL Image to base64 JPEG for Times Gate.
+
+    With max_bytes and/or min_psnr the JPEG quality is chosen adaptively
+    instead (see encode_to_budget).
+    """
+    # Themes already produce 128x128 RGB; only copy frames that need it
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if img.size != (SIZE, SIZE):
+        img = img.resize((SIZE, SIZE))
+    if max_bytes is None and min_psnr is None:
+        buf = _encode_buffer()
+        img.save(buf, format="JPEG", quality=quality)
+        with buf.getbuffer() as view:
+            return base64.b64encode(view).decode("utf-8")
+    data = encode_to_budget(img, max_bytes, min_psnr)[0]
+    return base64.b64encode(data).decode("utf-8")
+
+
+_buffers = threading.local()
+
+
+def _encode_buffer():
+    """Per-thread JPEG output buffer, rewound and reused for every frame."""
+    buf = getattr(_buffers, "buf", None)
+    if buf is None:
+        buf = _buffers.buf = io.BytesIO()
+    buf.seek(0)
+    buf.truncate()
+    return buf
+
+
+def _jpeg(img, quality, subsampling=None, optimize=False, progressive=False):
+    buf = _encode_buffer()
+    opts = {"quality": quality, "optimize": optimize, "progressive": progressive}
+    if subsampling is not None:
+        opts["subsampling"] = subsampling
+    img.save(buf, format="JPEG", **opts)
+    return buf.getvalue()
+
+
+def _b64_len(n):
+    """Length of the base64 PicData for n JPEG bytes."""
+    return 4 * ((n + 2) // 3)
+
+
+def psnr(img, jpeg_bytes):
+    """Peak signal-to-noise ratio (dB) of a JPEG against its source image."""
+    ref = np.asarray(img, dtype=np.float64)
+    with Image.open(io.BytesIO(jpeg_bytes)) as decoded:
+        out = np.asarray(decoded.convert("RGB"), dtype=np.float64)
+    mse = np.mean((ref - out) ** 2)
+    return float("inf") if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+def encode_to_budget(img, max_bytes=None, min_psnr=None, subsamplings=(2, 1, 0),
+                     optimize=True, progressive=False, qmin=20, qmax=95):
+    """Search JPEG settings for the smallest frame that is still good enough.
+
+    max_bytes caps the base64 PicData length; min_psnr is the quality floor
+    in dB. For each chroma subsampling mode the lowest quality meeting
+    min_psnr is found by bisection (or qmax without a floor), then lowered
+    further if it still exceeds max_bytes. The smallest candidate meeting
+    both limits wins; if none does, the budget takes priority.
+
+    Returns (jpeg_bytes, {"quality", "subsampling", "psnr", "bytes"}).
+    """
+    img = img.convert("RGB")
+    encoded = {}
+
+    def encode(q, ss):
+        if (q, ss) not in encoded:
+            data = _jpeg(img, q, ss, optimize, progressive)
+            encoded[q, ss] = (data, psnr(img, data))
+        return encoded[q, ss]
+
+    def fits(q, ss):
+        return max_bytes is None or _b64_len(len(encode(q, ss)[0])) <= max_bytes
+
+    def bisect(lo, hi, ok):
+        """Lowest q in [lo, hi] with ok(q) true, assuming ok is monotonic."""
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ok(mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    candidates = []
+    for ss in subsamplings:
+        q = qmax
+        if min_psnr is not None:
+            q = bisect(qmin, qmax, lambda q: encode(q, ss)[1] >= min_psnr)
+        if not fits(q, ss):
+            # Highest quality that still fits the budget
+            q = bisect(qmin, q, lambda q: not fits(q + 1, ss) if q < qmax else True)
+        data, score = encode(q, ss)
+        candidates.append((data, {"quality": q, "subsampling": ss, "psnr": score,
+                                  "bytes": _b64_len(len(data))}))
+
+    def rank(candidate):
+        info = candidate[1]
+        in_budget = max_bytes is None or info["bytes"] <= max_bytes
+        good = min_psnr is None or info["psnr"] >= min_psnr
+        if min_psnr is None:
+            # No floor: best quality that fits
+            return (not in_budget, -info["psnr"], info["bytes"])
+        return (not in_budget, not good, info["bytes"] if good else -info["psnr"])
+
+    return min(candidates, key=rank)
+
+
+def frame_budget(num_frames, total_bytes=None, frame_bytes=None):
+    """Per-frame max_bytes for image_to_picdata, or None for no budget.
+
+    An animation budget (total_bytes) is split evenly across num_frames and
+    combined with the per-frame cap, so long animations stay within the
+    device's limits.
+    """
+    if total_bytes and num_frames:
+        share = total_bytes // num_frames
+        return share if frame_bytes is None else min(frame_bytes, share)
+    return frame_bytes
+
+
+def frame_to_picdata(frame, **encode_opts):
+    """image_to_picdata for a PIL image or an RGB array."""
+    if isinstance(frame, np.ndarray):
+        frame = Image.fromarray(frame)
+    return image_to_picdata(frame, **encode_opts)
+
+
+@functools.lru_cache(maxsize=32)
+def _glow_masks(text, font, radii):
+    """Render text once and spread it into one L-mode mask per radius.
+
+    Each mask is the text coverage dilated by a disc of that radius and
+    combined as 1 - prod(1 - a), which is exactly what stacking a draw.text
+    call at every (dx, dy) inside the disc produced. Masks are padded by the
+    largest radius on every side.
+    """
+    pad = max(radii)
+    left, top, right, bottom = font.getbbox(text)
+    mask = Image.new("L", (right + 2 * pad, bottom + 2 * pad), 0)
+    ImageDraw.Draw(mask).text((pad, pad), text, fill=255, font=font)
+    cover = np.asarray(mask, dtype=np.float64) / 255
+    h, w = cover.shape
+    padded = np.pad(cover, pad)
+
+    masks = []
+    for radius in radii:
+        clear = np.ones_like(cover)
+        for dx in range(-radius, radius + 1):
+            for dy in range(-radius, radius + 1):
+                if dx * dx + dy * dy <= radius * radius:
+                    clear *= 1 - padded[pad - dy:pad - dy + h, pad - dx:pad - dx + w]
+        masks.append(Image.fromarray(np.rint(255 * (1 - clear)).astype(np.uint8)))
+    return masks
+
+
+def draw_text_glow(draw, xy, text, font, fill, layers):
+    """Draw text over glow/outline layers.
+
+    layers is a list of (radius, colour) pairs, outermost first. The text
+    mask is rasterized once per (text, font, layers) and reused. With
+    fill=None only the layers are drawn.
+    """
+    x, y = xy
+    if layers:
+        radii = tuple(radius for radius, _ in layers)
+        pad = max(radii)
+        for mask, (_, colour) in zip(_glow_masks(text, font, radii), layers):
+            draw.bitmap((x - pad, y - pad), mask, fill=colour)
+    if fill is not None:
+        draw.text((x, y), text, fill=fill, font=font)
+
+
+class GlyphAtlas:
+    """Pre-rasterized text tiles for one font.
+
+    Each text (a single glyph or a short string) is rasterized once into a
+    padded L mask; tinted RGB tiles are built once per colour tier. blit()
+    then places a tile with a single Image.paste, which gives the same
+    pixels as draw.text at that position.
+    """
+
+    PAD = 4
+
+    def __init__(self, font):
+        self.font = font
+        self._masks = {}
+        self._tiles = {}
+
+    def mask(self, text):
+        if text not in self._masks:
+            right, bottom = self.font.getbbox(text)[2:]
+            mask = Image.new("L", (right + 2 * self.PAD, bottom + 2 * self.PAD), 0)
+            ImageDraw.Draw(mask).text((self.PAD, self.PAD), text, fill=255, font=self.font)
+            self._masks[text] = mask
+        return self._masks[text]
+
+    def tile(self, text, colour):
+        key = (text, colour)
+        if key not in self._tiles:
+            mask = self.mask(text)
+            self._tiles[key] = (Image.new("RGB", mask.size, colour), mask)
+        return self._tiles[key]
+
+    def preload(self, texts, colours):
+        for text in texts:
+            for colour in colours:
+                self.tile(text, colour)
+
+    def blit(self, img, xy, text, colour):
+        tile, mask = self.tile(text, colour)
+        img.paste(tile, (xy[0] - self.PAD, xy[1] - self.PAD), mask)
+
+
+def centered_x(draw, text, font):
+    """x position that centers text horizontally on the screen."""
+    bbox = draw.textbbox((0, 0), text, font=font)
+    return (SIZE - (bbox[2] - bbox[0])) // 2
 
 
 def draw_text_centered(draw, text, y, font, fill, outline=None, outline_width=2):
     """Draw text centered horizontally with optional outline."""
-    bbox = draw.textbbox((0, 0), text, font=font)
-    tw = bbox[2] - bbox[0]
-    x = (SIZE - tw) // 2
-    if outline:
-        for dx in range(-outline_width, outline_width + 1):
-            for dy in range(-outline_width, outline_width + 1):
-                if dx * dx + dy * dy <= outline_width * outline_width:
-                    draw.text((x + dx, y + dy), text, fill=outline, font=font)
-    draw.text((x, y), text, fill=fill, font=font)
+    x = centered_x(draw, text, font)
+    layers = [(outline_width, outline)] if outline else []
+    draw_text_glow(draw, (x, y), text, font, fill, layers)
+
+
+class Scene:
+    """Layered frame model for animated themes.
+
+    Layers are composited bottom to top on every frame:
+      opaque(img)        - full-screen static image, drawn once by the caller
+      static(render)     - render(draw, mask_draw) is called once; it paints
+                           colours into draw and coverage into mask_draw, and
+                           each frame pastes the cached pair with one call
+      dynamic(render)    - render(img, frame_idx) draws onto the frame, or
+                           returns a new image to replace it
+    Work per frame is then just the dynamic layers plus one paste per static
+    layer. size defaults to one screen; panoramas use (640, 128).
+    """
+
+    def __init__(self, background=(0, 0, 0), size=(SIZE, SIZE)):
+        self.background = background
+        self.size = size
+        self.layers = []
+
+    def opaque(self, img):
+        self.layers.append(("opaque", img))
+
+    def static(self, render, base=(0, 0, 0)):
+        """Add a static layer. base is the colour under transparent edges:
+        set it to the colour anti-aliased edges should blend toward."""
+        colour = Image.new("RGB", self.size, base)
+        mask = Image.new("L", self.size, 0)
+        render(ImageDraw.Draw(colour), ImageDraw.Draw(mask))
+        self.layers.append(("static", (colour, mask)))
+
+    def dynamic(self, render):
+        self.layers.append(("dynamic", render))
+
+    def render(self, frame_idx):
+        img = None
+        for kind, layer in self.layers:
+            if kind == "opaque":
+                if img is None:
+                    img = layer.copy()
+                else:
+                    img.paste(layer)
+                continue
+            if img is None:
+                img = Image.new("RGB", self.size, self.background)
+            if kind == "static":
+                colour, mask = layer
+                img.paste(colour, (0, 0), mask)
+            else:
+                out = layer(img, frame_idx)
+                if out is not None:
+                    img = out
+        return img
+
+    def frames(self, num_frames):
+        for frame_idx in range(num_frames):
+            yield self.render(frame_idx)
+
+
+def render_frames(render, num_frames, workers=None):
+    """Yield render(0) ... render(num_frames - 1) in frame order.
+
+    Frames must not depend on each other. With workers > 1 they are rendered
+    in a process pool (render must be a module-level function, so it can be
+    pickled) and merged back in frame order; otherwise lazily, one at a time.
+    """
+    if not workers or workers < 2 or num_frames < 2:
+        return map(render, range(num_frames))
+    return _render_pool(render, num_frames, workers)
+
+
+def _render_pool(render, num_frames, workers):
+    from concurrent.futures import ProcessPoolExecutor
+
+    # A few chunks per worker: fewer pickling round trips, still balanced
+    chunksize = max(1, num_frames // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(render, range(num_frames), chunksize=chunksize)
 
 
 # ==============================================================================
@@ -166,12 +393,12 @@ def make_screen_neon():
                   fill=(brightness, 0, brightness))
 
     # Stars in sky
-    random.seed(77)
+    rng = random.Random(77)
     for _ in range(60):
-        sx = random.randint(0, SIZE - 1)
-        sy = random.randint(0, horizon_y - 25)
-        b = random.randint(80, 230)
-        s = random.choice([1, 1, 1, 2])
+        sx = rng.randint(0, SIZE - 1)
+        sy = rng.randint(0, horizon_y - 25)
+        b = rng.randint(80, 230)
+        s = rng.choice([1, 1, 1, 2])
         if s == 1:
             draw.point((sx, sy), fill=(b, b, int(b * 0.8)))
         else:
@@ -188,13 +415,7 @@ def make_screen_neon():
     bbox = draw.textbbox((0, 0), "ERIK", font=font)
     tw = bbox[2] - bbox[0]
     tx = (SIZE - tw) // 2
-
-    for radius, color in glow_layers:
-        for dx in range(-radius, radius + 1):
-            for dy in range(-radius, radius + 1):
-                if dx * dx + dy * dy <= radius * radius:
-                    draw.text((tx + dx, 6 + dy), "ERIK", fill=color, font=font)
-    draw.text((tx, 6), "ERIK", fill=(220, 250, 255), font=font)
+    draw_text_glow(draw, (tx, 6), "ERIK", font, (220, 250, 255), glow_layers)
 
     # SALO - magenta neon glow
     font2 = get_font("bold", 40)
@@ -205,13 +426,7 @@ def make_screen_neon():
     bbox2 = draw.textbbox((0, 0), "SALO", font=font2)
     tw2 = bbox2[2] - bbox2[0]
     tx2 = (SIZE - tw2) // 2
-
-    for radius, color in glow_layers2:
-        for dx in range(-radius, radius + 1):
-            for dy in range(-radius, radius + 1):
-                if dx * dx + dy * dy <= radius * radius:
-                    draw.text((tx2 + dx, 68 + dy), "SALO", fill=color, font=font2)
-    draw.text((tx2, 68), "SALO", fill=(255, 220, 250), font=font2)
+    draw_text_glow(draw, (tx2, 68), "SALO", font2, (255, 220, 250), glow_layers2)
 
     return img
 
@@ -219,9 +434,52 @@ def make_screen_neon():
 # ==============================================================================
 # Screen 1: Cosmic Nebula Arcade - gas clouds, bright stars, rainbow letters
 # ==============================================================================
-def make_screen_arcade():
-    img = Image.new("RGB", (SIZE, SIZE), (2, 2, 8))
+@functools.lru_cache(maxsize=4)
+def _ring_lut(size):
+    """Squared pixel distance -> index of the concentric PIL ellipse covering it."""
+    d2 = np.arange(2 * size * size + 1)
+    # PIL fills ellipse r out to about r + 0.4 px from the centre
+    return np.maximum(np.ceil(np.sqrt(d2) - 0.4), 1).astype(np.int32)
+
+
+@functools.lru_cache(maxsize=32)
+def _blob_lut(radius, color):
+    """Ring index -> blob colour, with one extra black row for "outside"."""
+    t = np.zeros(radius + 2)
+    t[1:radius + 1] = (1.0 - np.arange(1, radius + 1) / radius) ** 1.5
+    return np.floor(t[:, None] * np.array(color)).astype(np.uint16)
+
+
+def radial_blobs(blobs, background=(0, 0, 0), size=SIZE):
+    """Additively blended soft radial blobs as a (size, size, 3) uint8 array.
+
+    blobs is a list of (cx, cy, radius, (r, g, b)); each pixel takes the
+    colour of the ring it falls in, scaled by (1 - ring/radius) ** 1.5,
+    matching concentric PIL ellipses of radius, radius-1, ... 1. The
+    falloff comes from lookup tables indexed by integer squared distance
+    over each blob's bounding box, and blobs are summed with saturation
+    like chained ImageChops.add.
+    """
+    total = np.empty((size, size, 3), dtype=np.uint16)
+    total[:] = background
+    rings = _ring_lut(size)
+    for cx, cy, radius, color in blobs:
+        y0, y1 = max(0, cy - radius - 1), min(size, cy + radius + 2)
+        x0, x1 = max(0, cx - radius - 1), min(size, cx + radius + 2)
+        d2 = (np.arange(y0, y1) - cy)[:, None] ** 2 + (np.arange(x0, x1) - cx)[None, :] ** 2
+        ring = np.minimum(rings[d2], radius + 1)
+        total[y0:y1, x0:x1] += _blob_lut(radius, tuple(color))[ring]
+    return np.minimum(total, 255).astype(np.uint8)
+
+
+def rainbow_bar(width=SIZE, hue_step=4):
+    """(width, 3) uint8 row of sine-wave rainbow colours, hue_step degrees per px."""
+    hue = np.radians((np.arange(width) * hue_step) % 360)[:, None]
+    phase = np.radians([0, 120, 240])
+    return (127 + 127 * np.sin(hue + phase)).astype(np.uint8)
 
+
+def make_screen_arcade():
     # Nebula clouds via additive blending of soft radial blobs
     nebula_data = [
         (30, 95, 55, (90, 20, 130)),    # purple blob bottom-left
@@ -230,25 +488,18 @@ def make_screen_arcade():
         (12, 18, 42, (10, 85, 95)),     # teal blob top-left
         (115, 105, 45, (110, 30, 85)),  # pink blob bottom-right
     ]
-    for cx, cy, radius, (nr, ng, nb) in nebula_data:
-        blob = Image.new("RGB", (SIZE, SIZE), (0, 0, 0))
-        blob_draw = ImageDraw.Draw(blob)
-        for r in range(radius, 0, -1):
-            t = (1.0 - r / radius) ** 1.5
-            color = (int(nr * t), int(ng * t), int(nb * t))
-            blob_draw.ellipse([cx - r, cy - r, cx + r, cy + r], fill=color)
-        img = ImageChops.add(img, blob)
+    img = Image.fromarray(radial_blobs(nebula_data, background=(2, 2, 8)))
 
     draw = ImageDraw.Draw(img)
 
     # Varied starfield
-    random.seed(42)
+    rng = random.Random(42)
     for _ in range(160):
-        sx = random.randint(0, SIZE - 1)
-        sy = random.randint(0, SIZE - 1)
-        brightness = random.randint(60, 255)
-        size = random.choices([1, 2, 3], weights=[20, 3, 1])[0]
-        tint = random.choice([
+        sx = rng.randint(0, SIZE - 1)
+        sy = rng.randint(0, SIZE - 1)
+        brightness = rng.randint(60, 255)
+        size = rng.choices([1, 2, 3], weights=[20, 3, 1])[0]
+        tint = rng.choice([
             (1.0, 1.0, 1.0), (1.0, 0.9, 0.7), (0.7, 0.85, 1.0), (1.0, 0.75, 0.75),
         ])
         sr = min(255, int(brightness * tint[0]))
@@ -302,21 +553,15 @@ def make_screen_arcade():
         draw.text((cx2, 58), letter, fill=color, font=font)
         cx2 += lw + spacing
 
-    # Rainbow bar at bottom
-    for x in range(SIZE):
-        hue = (x * 4) % 360
-        r = int(127 + 127 * math.sin(math.radians(hue)))
-        g = int(127 + 127 * math.sin(math.radians(hue + 120)))
-        b = int(127 + 127 * math.sin(math.radians(hue + 240)))
-        for y in range(100, 108):
-            draw.point((x, y), fill=(r, g, b))
-
     # Pixel border
     for i in range(0, SIZE, 6):
         draw.rectangle([i, 0, i + 2, 2], fill=(80, 80, 80))
         draw.rectangle([i, 125, i + 2, 127], fill=(80, 80, 80))
 
-    return img
+    # Rainbow bar at bottom, as one array slice
+    pixels = np.asarray(img).copy()
+    pixels[100:108] = rainbow_bar()
+    return Image.fromarray(pixels)
 
 
 # ==============================================================================
@@ -360,11 +605,11 @@ def make_screen_gold():
         draw.polygon(pts, outline=(110, 80, 28))
 
     # Gold shimmer dots
-    random.seed(99)
+    rng = random.Random(99)
     for _ in range(50):
-        sx = random.randint(10, SIZE - 10)
-        sy = random.randint(10, SIZE - 10)
-        b = random.randint(120, 210)
+        sx = rng.randint(10, SIZE - 10)
+        sy = rng.randint(10, SIZE - 10)
+        b = rng.randint(120, 210)
         draw.point((sx, sy), fill=(b, int(b * 0.78), int(b * 0.2)))
 
     # --- Ornamental frame and text (same content) ---
@@ -404,196 +649,288 @@ def make_screen_gold():
 # ==============================================================================
 # Screen 3: Matrix City - skyline silhouette with lit windows + rain
 # ==============================================================================
-def make_screen_matrix(num_frames=10):
-    random.seed(123)
-    frames = []
+def make_screen_matrix(num_frames=10, workers=None):
+    return list(iter_screen_matrix(num_frames, workers))
+
+
+def iter_screen_matrix(num_frames=10, workers=None):
+    """Yield Matrix City frames in order; workers > 1 renders them in processes."""
+    return render_frames(render_matrix_frame, num_frames, workers)
+
+
+def render_matrix_frame(frame_idx):
+    return matrix_scene().render(frame_idx)
+
+
+@functools.lru_cache(maxsize=1)
+def matrix_scene():
+    """Matrix City Scene, built once per process; every frame renders from it."""
+    rng = random.Random(123)
 
     # Pre-generate rain columns
     columns = []
     for c in range(20):
         columns.append({
-            "chars": [chr(random.randint(0x30A0, 0x30FF)) if random.random() > 0.3
-                      else chr(random.randint(33, 126)) for _ in range(30)],
-            "speed": random.uniform(0.5, 2.0),
-            "offset": random.uniform(0, 30),
+            "chars": [chr(rng.randint(0x30A0, 0x30FF)) if rng.random() > 0.3
+                      else chr(rng.randint(33, 126)) for _ in range(30)],
+            "speed": rng.uniform(0.5, 2.0),
+            "offset": rng.uniform(0, 30),
         })
 
     # Pre-generate city skyline
-    random.seed(456)
+    rng = random.Random(456)
     buildings = []
     bx = 0
     while bx < SIZE:
-        bw = random.randint(6, 16)
-        bh = random.randint(18, 60)
+        bw = rng.randint(6, 16)
+        bh = rng.randint(18, 60)
         buildings.append((bx, bw, bh))
-        bx += bw + random.randint(1, 4)
+        bx += bw + rng.randint(1, 4)
+
+    # Top-left corner of every window, building by building
+    window_xy = np.array([
+        (wx, wy)
+        for bx, bw, bh in buildings
+        for wy in range(SIZE - bh + 4, SIZE - 3, 6)
+        for wx in range(bx + 2, bx + bw - 2, 4)
+    ])
 
     font_small = get_font("regular", 10)
     font_name = get_font("bold", 30)
 
-    for frame_idx in range(num_frames):
-        img = Image.new("RGB", (SIZE, SIZE), (0, 0, 0))
+    # Rain colour tiers by distance from the head of each column
+    tiers = {0: (180, 255, 180)}
+    for dist in range(1, 3):
+        tiers[dist] = (0, max(0, 200 - dist * 60), 0)
+    for dist in range(3, 7):
+        tiers[dist] = (0, max(0, 80 - (dist - 3) * 20), 0)
+
+    rain = GlyphAtlas(font_small)
+    for col in columns:
+        for i, ch in enumerate(col["chars"]):
+            try:
+                rain.preload([ch], tiers.values())
+            except Exception:
+                col["chars"][i] = "?"
+                rain.preload(["?"], tiers.values())
+    names = GlyphAtlas(font_name)
+    scene = Scene()
+
+    # Static skyline: building bodies and roof lines never change
+    skyline = Image.new("RGB", (SIZE, SIZE), (0, 0, 0))
+    sky_draw = ImageDraw.Draw(skyline)
+    for bx, bw, bh in buildings:
+        top = SIZE - bh
+        # Building body (very dark green)
+        sky_draw.rectangle([bx, top, bx + bw, SIZE - 1], fill=(0, 8, 0))
+        # Roof accent line
+        sky_draw.line([(bx, top), (bx + bw, top)], fill=(0, 25, 0))
+    scene.opaque(skyline)
+
+    def windows(img, frame_idx):
+        # Lit windows (flickering per frame), drawn for the whole city at once
+        rng = np.random.default_rng((456, frame_idx))
+        lit = rng.random(len(window_xy)) > 0.4
+        brightness = rng.integers(18, 51, len(window_xy))
         draw = ImageDraw.Draw(img)
-        t = frame_idx
-
-        # City skyline silhouette with flickering windows
-        for bx, bw, bh in buildings:
-            top = SIZE - bh
-            # Building body (very dark green)
-            draw.rectangle([bx, top, bx + bw, SIZE - 1], fill=(0, 8, 0))
-            # Roof accent line
-            draw.line([(bx, top), (bx + bw, top)], fill=(0, 25, 0))
-            # Lit windows (flickering per frame)
-            random.seed(frame_idx * 13 + bx * 7)
-            for wy in range(top + 4, SIZE - 3, 6):
-                for wx in range(bx + 2, bx + bw - 2, 4):
-                    if random.random() > 0.4:
-                        brightness = random.randint(18, 50)
-                        draw.rectangle([wx, wy, wx + 1, wy + 2],
-                                       fill=(0, brightness, 0))
-
-        # Matrix rain
+        for (wx, wy), b in zip(window_xy[lit].tolist(), brightness[lit].tolist()):
+            draw.rectangle([wx, wy, wx + 1, wy + 2], fill=(0, b, 0))
+    scene.dynamic(windows)
+
+    def matrix_rain(img, t):
+        # Matrix rain, blitted from the glyph atlas
         for col_idx, col in enumerate(columns):
             x = col_idx * 7
             pos = (col["offset"] + t * col["speed"]) % 30
             for row in range(20):
-                char_idx = int(pos + row) % len(col["chars"])
-                y = row * 7
                 dist = row - int(pos) % 20
                 if dist < 0:
                     dist += 20
-                if dist == 0:
-                    color = (180, 255, 180)
-                elif dist < 3:
-                    color = (0, max(0, 200 - dist * 60), 0)
-                elif dist < 7:
-                    color = (0, max(0, 80 - (dist - 3) * 20), 0)
-                else:
-                    continue
-                try:
-                    draw.text((x, y), col["chars"][char_idx], fill=color, font=font_small)
-                except:
-                    draw.text((x, y), "?", fill=color, font=font_small)
-
-        # Name overlay with dark background for readability
+                if dist in tiers:
+                    char_idx = int(pos + row) % len(col["chars"])
+                    rain.blit(img, (x, row * 7), col["chars"][char_idx], tiers[dist])
+    scene.dynamic(matrix_rain)
+
+    # Name overlay with dark background for readability: boxes and outlines
+    # are static, only the pulsing fill changes
+    name_pos = []
+
+    def name_boxes(draw, mask_draw):
+        for box in ([10, 30, 118, 62], [10, 68, 118, 100]):
+            draw.rectangle(box, fill=(0, 10, 0))
+            mask_draw.rectangle(box, fill=255)
+        for text, y in (("ERIK", 32), ("SALO", 70)):
+            x = centered_x(draw, text, font_name)
+            name_pos.append((text, x, y))
+            draw_text_glow(draw, (x, y), text, font_name, None, [(2, (0, 40, 0))])
+            draw_text_glow(mask_draw, (x, y), text, font_name, None, [(2, 255)])
+    scene.static(name_boxes, base=(0, 40, 0))
+
+    def name_fill(img, frame_idx):
         pulse = 0.7 + 0.3 * math.sin(frame_idx * math.pi / 3)
         bright = int(255 * pulse)
+        for text, x, y in name_pos:
+            names.blit(img, (x, y), text, (bright, 255, bright))
+    scene.dynamic(name_fill)
 
-        draw.rectangle([10, 30, 118, 62], fill=(0, 10, 0))
-        draw.rectangle([10, 68, 118, 100], fill=(0, 10, 0))
-
-        draw_text_centered(draw, "ERIK", 32, font_name, (bright, 255, bright),
-                          outline=(0, 40, 0), outline_width=2)
-        draw_text_centered(draw, "SALO", 70, font_name, (bright, 255, bright),
-                          outline=(0, 40, 0), outline_width=2)
-
-        frames.append(img)
-
-    return frames
+    return scene
 
 
 # ==============================================================================
 # Screen 4: Volcanic Fire - smoke, rocky ground, lava cracks, embers
 # ==============================================================================
-def make_screen_fire(num_frames=10):
+def _mt_stream(seed):
+    """NumPy RandomState producing the same stream as random.Random(seed)."""
+    state = random.Random(seed).getstate()[1]
+    rs = np.random.RandomState()
+    rs.set_state(("MT19937", np.array(state[:624], dtype=np.uint32), state[624]))
+    return rs
+
+
+def fire_gradient(frame_indices):
+    """Fire gradient with smoke for each frame, as a (F, SIZE, SIZE, 3) uint8 array.
+
+    Heat, noise, flicker, smoke and colour mapping are evaluated as whole-array
+    operations over 2-pixel-wide columns. Noise for frame N is drawn from the
+    same Mersenne Twister stream as random.Random(N * 7 + 99), so the result
+    matches the old per-pixel loop.
+    """
+    frame_indices = np.asarray(list(frame_indices))
+    half = SIZE // 2
+    y = np.arange(SIZE, dtype=np.float64)[:, None]
+    x = np.arange(0, SIZE, 2, dtype=np.float64)[None, :]
+
+    noise = np.stack([
+        0.6 + 0.4 * _mt_stream(int(f) * 7 + 99).random_sample((SIZE, half))
+        for f in frame_indices
+    ])
+    heat = (SIZE - y) / SIZE
+    flicker = 0.8 + 0.2 * np.sin(x * 0.3 + frame_indices[:, None, None] * 1.2)
+    intensity = heat * noise * flicker
+    # Smoke dampening at top
+    intensity = np.where(y < 30, intensity * (y / 30), intensity)
+
+    hot = intensity > 0.7
+    warm = intensity > 0.4
+    glow = intensity > 0.15
+    r = np.select([hot, warm, glow], [255, (255 * intensity).astype(int),
+                                      (200 * intensity).astype(int)],
+                  (80 * intensity).astype(int))
+    g = np.select([hot, warm, glow], [(220 * intensity).astype(int),
+                                      (130 * intensity).astype(int),
+                                      (50 * intensity).astype(int)], 0)
+    b = np.where(hot, (80 * intensity).astype(int), 0)
+
+    # Smoky gray tint at top
+    smoke_t = np.where(y < 25, (25 - y) / 25, 0.0)
+    r = r + (30 * smoke_t * noise).astype(int)
+    g = g + (25 * smoke_t * noise).astype(int)
+    b = b + (22 * smoke_t * noise).astype(int)
+
+    rgb = np.minimum(np.stack([r, g, b], axis=-1), 255).astype(np.uint8)
+    # Each noise sample covers a 2-pixel-wide column pair
+    return np.repeat(rgb, 2, axis=2)
+
+
+def make_screen_fire(num_frames=10, workers=None):
+    return list(iter_screen_fire(num_frames, workers))
+
+
+def iter_screen_fire(num_frames=10, workers=None):
+    """Yield Volcanic Fire frames in order; workers > 1 renders them in processes."""
+    return render_frames(render_fire_frame, num_frames, workers)
+
+
+def render_fire_frame(frame_idx):
+    return fire_scene().render(frame_idx)
+
+
+@functools.lru_cache(maxsize=1)
+def fire_scene():
+    """Volcanic Fire Scene, built once per process; every frame renders from it."""
     # Pre-generate ember particles
-    random.seed(8888)
+    rng = random.Random(8888)
     embers = [
-        (random.randint(5, SIZE - 5), random.randint(0, SIZE - 1),
-         random.uniform(1.5, 4.0), random.randint(160, 255))
+        (rng.randint(5, SIZE - 5), rng.randint(0, SIZE - 1),
+         rng.uniform(1.5, 4.0), rng.randint(160, 255))
         for _ in range(30)
     ]
 
     # Pre-generate rocky ground profile
-    random.seed(555)
-    ground_profile = [random.randint(88, 105) for _ in range(SIZE)]
+    rng = random.Random(555)
+    ground_profile = [rng.randint(88, 105) for _ in range(SIZE)]
     # Smooth it
     smoothed = ground_profile[:]
     for i in range(1, SIZE - 1):
         smoothed[i] = (ground_profile[i - 1] + ground_profile[i] + ground_profile[i + 1]) // 3
     ground_profile = smoothed
+    ground_top = np.array(ground_profile)
 
     # Pre-generate lava cracks
-    random.seed(777)
+    rng = random.Random(777)
     cracks = []
     for _ in range(5):
-        cx = random.randint(8, SIZE - 8)
-        cy = random.randint(95, 115)
+        cx = rng.randint(8, SIZE - 8)
+        cy = rng.randint(95, 115)
         segs = []
-        for _ in range(random.randint(4, 8)):
-            nx = max(2, min(SIZE - 2, cx + random.randint(-8, 8)))
-            ny = max(88, min(SIZE - 2, cy + random.randint(-4, 4)))
+        for _ in range(rng.randint(4, 8)):
+            nx = max(2, min(SIZE - 2, cx + rng.randint(-8, 8)))
+            ny = max(88, min(SIZE - 2, cy + rng.randint(-4, 4)))
             segs.append((cx, cy, nx, ny))
             cx, cy = nx, ny
         cracks.append(segs)
 
-    frames = []
+    font = get_font("bold", 36)
+    scene = Scene()
 
-    for frame_idx in range(num_frames):
-        random.seed(frame_idx * 7 + 99)
-        img = Image.new("RGB", (SIZE, SIZE), (0, 0, 0))
-        draw = ImageDraw.Draw(img)
-
-        # Fire gradient from bottom with smoke dampening at top
-        for y in range(SIZE):
-            for x in range(0, SIZE, 2):
-                heat = max(0, (SIZE - y) / SIZE)
-                noise = random.uniform(0.6, 1.0)
-                flicker = 0.8 + 0.2 * math.sin(x * 0.3 + frame_idx * 1.2)
-                intensity = heat * noise * flicker
-
-                # Smoke dampening at top
-                if y < 30:
-                    smoke_fade = y / 30
-                    intensity *= smoke_fade
-
-                if intensity > 0.7:
-                    r, g, b = 255, int(220 * intensity), int(80 * intensity)
-                elif intensity > 0.4:
-                    r, g, b = int(255 * intensity), int(130 * intensity), 0
-                elif intensity > 0.15:
-                    r, g, b = int(200 * intensity), int(50 * intensity), 0
-                else:
-                    r, g, b = int(80 * intensity), 0, 0
-
-                # Smoky gray tint at top
-                if y < 25:
-                    smoke_t = (25 - y) / 25
-                    r = min(255, r + int(30 * smoke_t * noise))
-                    g = min(255, g + int(25 * smoke_t * noise))
-                    b = min(255, b + int(22 * smoke_t * noise))
-
-                r, g, b = min(255, r), min(255, g), min(255, b)
-                draw.rectangle([x, y, x + 1, y], fill=(r, g, b))
+    def flames(img, frame_idx):
+        return Image.fromarray(fire_gradient([frame_idx])[0])
+    scene.dynamic(flames)
 
+    def ground(draw, mask_draw):
         # Rocky ground silhouette
         for x in range(SIZE):
             gy = ground_profile[x]
             draw.line([(x, gy), (x, SIZE - 1)], fill=(22, 7, 2))
-
-        # Ground texture dots
-        random.seed(frame_idx + 5000)
-        for _ in range(180):
-            rx = random.randint(0, SIZE - 1)
-            gy = ground_profile[rx]
-            ry = random.randint(gy, SIZE - 1)
-            v = random.randint(12, 38)
-            draw.point((rx, ry), fill=(v, v // 4, 0))
-
+            mask_draw.line([(x, gy), (x, SIZE - 1)], fill=255)
+    scene.static(ground)
+
+    def ground_texture(img, frame_idx):
+        # 180 speckles below the ground line, drawn as one array write
+        rng = np.random.default_rng((5000, frame_idx))
+        rx = rng.integers(0, SIZE, 180)
+        ry = rng.integers(ground_top[rx], SIZE)
+        v = rng.integers(12, 39, 180)
+        pixels = np.array(img)
+        pixels[ry, rx] = np.stack([v, v // 4, np.zeros_like(v)], axis=-1)
+        return Image.fromarray(pixels)
+    scene.dynamic(ground_texture)
+
+    # Crack geometry is static: record which pixels end up as core (1) or
+    # glow (2) in drawing order, so each frame only pastes the two colours
+    labels = Image.new("L", (SIZE, SIZE), 0)
+    label_draw = ImageDraw.Draw(labels)
+    for crack in cracks:
+        for cx1, cy1, cx2, cy2 in crack:
+            label_draw.line([(cx1, cy1), (cx2, cy2)], fill=1, width=1)
+            # Glow around crack
+            label_draw.line([(cx1, cy1 - 1), (cx2, cy2 - 1)], fill=2, width=1)
+            label_draw.line([(cx1, cy1 + 1), (cx2, cy2 + 1)], fill=2, width=1)
+    crack_core = labels.point(lambda v: 255 if v == 1 else 0)
+    crack_glow = labels.point(lambda v: 255 if v == 2 else 0)
+
+    def lava_cracks(img, frame_idx):
         # Pulsing lava cracks
         crack_pulse = 0.6 + 0.4 * math.sin(frame_idx * 0.7)
-        for crack in cracks:
-            for cx1, cy1, cx2, cy2 in crack:
-                cr = min(255, int(255 * crack_pulse))
-                cg = min(255, int(100 * crack_pulse))
-                draw.line([(cx1, cy1), (cx2, cy2)], fill=(cr, cg, 0), width=1)
-                # Glow around crack
-                draw.line([(cx1, cy1 - 1), (cx2, cy2 - 1)],
-                          fill=(cr // 4, cg // 4, 0), width=1)
-                draw.line([(cx1, cy1 + 1), (cx2, cy2 + 1)],
-                          fill=(cr // 4, cg // 4, 0), width=1)
+        cr = min(255, int(255 * crack_pulse))
+        cg = min(255, int(100 * crack_pulse))
+        img.paste((cr, cg, 0), (0, 0, SIZE, SIZE), crack_core)
+        img.paste((cr // 4, cg // 4, 0), (0, 0, SIZE, SIZE), crack_glow)
+    scene.dynamic(lava_cracks)
 
+    def ember_particles(img, frame_idx):
         # Floating embers drifting upward
+        draw = ImageDraw.Draw(img)
         for ex, base_ey, speed, brightness in embers:
             ey = int(base_ey - frame_idx * speed) % SIZE
             # Only show embers above the ground
@@ -608,17 +945,16 @@ def make_screen_fire(num_frames=10):
                         gx, gy = ex + dp[0], ey + dp[1]
                         if 0 <= gx < SIZE and 0 <= gy < SIZE:
                             draw.point((gx, gy), fill=(er // 4, eg // 4, 0))
+    scene.dynamic(ember_particles)
 
-        # Name text
-        font = get_font("bold", 36)
-        draw_text_centered(draw, "ERIK", 20, font, (255, 255, 220),
-                          outline=(50, 10, 0), outline_width=3)
-        draw_text_centered(draw, "SALO", 70, font, (255, 255, 220),
-                          outline=(50, 10, 0), outline_width=3)
-
-        frames.append(img)
+    def name_text(draw, mask_draw):
+        for text, y in (("ERIK", 20), ("SALO", 70)):
+            x = centered_x(draw, text, font)
+            draw_text_glow(draw, (x, y), text, font, (255, 255, 220), [(3, (50, 10, 0))])
+            draw_text_glow(mask_draw, (x, y), text, font, 255, [(3, 255)])
+    scene.static(name_text, base=(50, 10, 0))
 
-    return frames
+    return scene
 
 
 # ==============================================================================
@@ -630,52 +966,68 @@ def main():
     print(f"  Device: {DEVICE_IP} | Resolution: {SIZE}x{SIZE} JPEG")
     print("=" * 60)
 
-    print("\n[1] Resetting GIF cache...")
-    send_command({"Command": "Draw/ResetHttpGifId"})
-    time.sleep(0.5)
+    # Screens whose content matches what was last sent are skipped;
+    # pass --force to resend everything
+    state = ScreenState(DEVICE_IP)
+    if "--force" in sys.argv[1:]:
+        state.forget()
+
+    print("\n[1] Rendering screens...")
+    screens = [
+        (0, "Synthwave Neon", "neon", [make_screen_neon()], None),
+        (1, "Cosmic Nebula Arcade", "arcade", [make_screen_arcade()], None),
+        (2, "Art Deco Gold", "gold", [make_screen_gold()], None),
+        (3, "Matrix City (animated)", "matrix", make_screen_matrix(num_frames=10), 300),
+        (4, "Volcanic Fire (animated)", "fire", make_screen_fire(num_frames=10), 250),
+    ]
+    pending = []
+    for screen_id, label, name, frames, speed_ms in screens:
+        frames[0].save(f"screen{screen_id}_{name}.png")
+        picdata = [image_to_picdata(frame) for frame in frames]
+        digest = content_hash(picdata, speed_ms)
+        if state.changed(screen_id, digest):
+            pending.append((screen_id, label, picdata, speed_ms, digest))
+        else:
+            print(f"  Screen {screen_id} unchanged, skipping")
+
+    if pending:
+        print("\n[2] Resetting GIF cache...")
+        send_command({"Command": "Draw/ResetHttpGifId"})
 
-    print("\n[2] Setting brightness...")
+    print("\n[3] Setting brightness...")
     send_command({"Command": "Channel/SetBrightness", "Brightness": 80})
-    time.sleep(0.3)
-
-    # Generate and send each screen
-    print("\n[3] Screen 0: Synthwave Neon")
-    img0 = make_screen_neon()
-    img0.save("screen0_neon.png")
-    send_to_screen(0, img0)
-    time.sleep(0.5)
-
-    print("\n[4] Screen 1: Cosmic Nebula Arcade")
-    img1 = make_screen_arcade()
-    img1.save("screen1_arcade.png")
-    send_to_screen(1, img1)
-    time.sleep(0.5)
-
-    print("\n[5] Screen 2: Art Deco Gold")
-    img2 = make_screen_gold()
-    img2.save("screen2_gold.png")
-    send_to_screen(2, img2)
-    time.sleep(0.5)
-
-    print("\n[6] Screen 3: Matrix City (animated)")
-    frames3 = make_screen_matrix(num_frames=10)
-    frames3[0].save("screen3_matrix.png")
-    send_animation(3, frames3, speed_ms=300)
-    time.sleep(0.5)
-
-    print("\n[7] Screen 4: Volcanic Fire (animated)")
-    frames4 = make_screen_fire(num_frames=10)
-    frames4[0].save("screen4_fire.png")
-    send_animation(4, frames4, speed_ms=250)
+
+    updated = 0
+    for step, (screen_id, label, picdata, speed_ms, digest) in enumerate(pending, 4):
+        print(f"\n[{step}] Screen {screen_id}: {label}")
+        if speed_ms is None:
+            pic_id = new_pic_id(screen_id)
+            ok = command_ok(send_to_screen(screen_id, picdata[0], pic_id=pic_id))
+        else:
+            result = send_animation(screen_id, picdata, speed_ms=speed_ms)
+            ok, pic_id = result["ok"], result["pic_id"]
+        if ok:
+            state.record(screen_id, digest, pic_id, label)
+            updated += 1
+        else:
+            # The screen may be half-written; make the next run resend it
+            state.forget([screen_id])
+    state.save()
 
     print("\n" + "=" * 60)
-    print("  All 5 screens updated!")
+    print(f"  {updated} of 5 screens updated!")
+    if updated < len(pending):
+        print(f"  {len(pending) - updated} screens failed and will be resent next time")
     print("  0: Synthwave Neon (retro sun + grid floor)")
     print("  1: Cosmic Nebula (gas clouds + starfield)")
     print("  2: Art Deco Gold (sunburst + diamonds)")
     print("  3: Matrix City (skyline + rain)")
     print("  4: Volcanic Fire (lava cracks + embers)")
+    if get_client().flow:
+        print(f"  {get_client().flow.summary()}")
     print("=" * 60)
+    if updated < len(pending):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
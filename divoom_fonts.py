@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Divoom Times Gate font resolver.
+Finds each font family once per process and memoizes loaded ImageFont
+objects by (family, size), so theme renders never touch the disk for fonts.
+
+Lookup order for a family: files named in FAMILIES found in DIVOOM_FONT_PATH
+(os.pathsep-separated) and the platform font directories; then fontconfig
+(fc-match); then Pillow's built-in font. No font files ship with the repo;
+put one in DIVOOM_FONT_PATH to pin a typeface on every machine.
+
+Usage:
+    python divoom_fonts.py        show what each family resolves to
+"""
+
+import sys
+import os
+import functools
+import shutil
+import subprocess
+import time
+
+from PIL import ImageFont
+
+# Candidate file names per family, in order of preference, followed by a
+# fontconfig pattern used when none of the files is installed
+FAMILIES = {
+    "bold": {
+        "files": ["arialbd.ttf", "calibrib.ttf", "Arial Bold.ttf",
+                  "LiberationSans-Bold.ttf", "DejaVuSans-Bold.ttf"],
+        "fontconfig": "Arial:bold",
+    },
+    "regular": {
+        "files": ["arial.ttf", "calibri.ttf", "Arial.ttf",
+                  "LiberationSans-Regular.ttf", "DejaVuSans.ttf"],
+        "fontconfig": "Arial",
+    },
+    "script": {
+        "files": ["MISTRAL.TTF", "PRISTINA.TTF", "segoesc.ttf", "Apple Chancery.ttf",
+                  "SnellRoundhand.ttc", "Z003-MediumItalic.otf",
+                  "URWChanceryL-MediItal.ttf", "arial.ttf",
+                  "LiberationSerif-Italic.ttf", "DejaVuSerif-Italic.ttf", "DejaVuSans.ttf"],
+        "fontconfig": "cursive",
+    },
+    "impact": {
+        "files": ["impact.ttf", "Impact.ttf", "arialbd.ttf",
+                  "LiberationSans-Bold.ttf", "DejaVuSans-Bold.ttf"],
+        "fontconfig": "Impact",
+    },
+}
+
+
+def font_dirs():
+    """Directories searched for font files, most specific first."""
+    home = os.path.expanduser("~")
+    dirs = [d for d in os.environ.get("DIVOOM_FONT_PATH", "").split(os.pathsep) if d]
+    if sys.platform == "win32":
+        windir = os.environ.get("WINDIR", "C:/Windows")
+        dirs += [os.path.join(windir, "Fonts"),
+                 os.path.join(os.environ.get("LOCALAPPDATA", home),
+                              "Microsoft", "Windows", "Fonts")]
+    elif sys.platform == "darwin":
+        dirs += [os.path.join(home, "Library", "Fonts"), "/Library/Fonts",
+                 "/System/Library/Fonts", "/System/Library/Fonts/Supplemental"]
+    else:
+        dirs += [os.path.join(home, ".local", "share", "fonts"),
+                 os.path.join(home, ".fonts"),
+                 "/usr/local/share/fonts", "/usr/share/fonts"]
+    return dirs
+
+
+@functools.lru_cache(maxsize=1)
+def _file_index():
+    """Lower-cased file name -> path for every font under font_dirs()."""
+    index = {}
+    for root_dir in font_dirs():
+        for root, _, names in os.walk(root_dir):
+            for name in names:
+                index.setdefault(name.lower(), os.path.join(root, name))
+    return index
+
+
+def _fontconfig(pattern):
+    if shutil.which("fc-match") is None:
+        return None
+    try:
+        out = subprocess.run(["fc-match", "--format=%{file}", pattern],
+                             capture_output=True, text=True, timeout=5).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.strip() or None
+
+
+# family -> (path or None, how it was found, seconds spent resolving)
+_resolved = {}
+
+
+def resolve(family):
+    """Path of the font file for a family, or None if only the built-in font is left.
+
+    Unknown families resolve like "regular". The result is cached.
+    """
+    family = family if family in FAMILIES else "regular"
+    if family not in _resolved:
+        start = time.perf_counter()
+        spec = FAMILIES[family]
+        path, source = None, "default"
+        index = _file_index()
+        for name in spec["files"]:
+            if name.lower() in index:
+                path, source = index[name.lower()], "file"
+                break
+        else:
+            path = _fontconfig(spec["fontconfig"])
+            if path:
+                source = "fontconfig"
+        _resolved[family] = (path, source, time.perf_counter() - start)
+    return _resolved[family][0]
+
+
+@functools.lru_cache(maxsize=64)
+def get_font(family, size):
+    """Memoized ImageFont for a family ("bold", "regular", "script", "impact")."""
+    path = resolve(family)
+    if path:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            pass
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # Pillow < 10.1: bitmap font, fixed size
+        return ImageFont.load_default()
+
+
+def resolved_paths():
+    """family -> font file (None for Pillow's built-in), for cache keys."""
+    return {family: resolve(family) for family in FAMILIES}
+
+
+def stats():
+    """Resolution results and timings plus get_font() cache hit counts."""
+    info = get_font.cache_info()
+    return {
+        "families": {
+            family: {"path": path, "source": source, "resolve_ms": seconds * 1e3}
+            for family, (path, source, seconds) in _resolved.items()
+        },
+        "hits": info.hits,
+        "misses": info.misses,
+        "loaded": info.currsize,
+    }
+
+
+def main():
+    for family in FAMILIES:
+        resolve(family)
+    s = stats()
+    for family, entry in s["families"].items():
+        print(f"  {family:8s} {entry['source']:10s} {entry['resolve_ms']:7.2f}ms  "
+              f"{entry['path'] or '(Pillow built-in)'}")
+    print(f"Searched: {os.pathsep.join(font_dirs())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Divoom Times Gate animation import.
+Plays animated GIF, WebP and APNG files (or any still image Pillow can
+open) on the 128x128 screens. The source is read a frame at a time, twice,
+so memory stays flat however long or large it is:
+
+  scan()         decodes each frame once, reduced to a 16x16 signature, to
+                 collect durations and merge runs of near-duplicate frames,
+                 then plans at most MAX_FRAMES output frames
+  iter_frames()  decodes the source again and yields only the planned
+                 frames, shrunk with draft()/reduce() before one final
+                 resample to 128x128
+
+The device shows every frame of an animation for the same PicSpeed, so the
+source timeline is resampled onto a uniform clock: long holds become
+repeated frames and fast sections are decimated.
+
+Usage:
+    python divoom_import.py <file> <screen> [<screen>...] [--crop]
+    python divoom_import.py <file> --info
+    python divoom_import.py <file> --bundle out.dvb
+"""
+
+import sys
+import os
+import argparse
+import bisect
+import time
+
+import numpy as np
+from PIL import Image, ImageOps, ImageSequence
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from divoom_erik import SIZE
+
+# Longest animation the device plays reliably (see DIVOOM_TIMESGATE_API.md)
+MAX_FRAMES = 40
+# Browsers show frames of 10ms or less for 100ms; so do we
+DEFAULT_DURATION = 100
+SIGNATURE = 16
+# Largest per-pixel difference (0-255) between two signatures that still
+# counts as the same frame; a max, so small moving objects are not merged
+DUPLICATE_THRESHOLD = 6.0
+
+
+def _draft(img):
+    # Lets JPEG stills decode at a fraction of full size; no-op for the rest
+    img.draft("RGB", (SIZE, SIZE))
+    return img
+
+
+def _duration(frame):
+    ms = frame.info.get("duration") or 0
+    return int(round(ms)) if ms > 10 else DEFAULT_DURATION
+
+
+def _reduced(frame, size):
+    """frame as RGB over black, box-reduced by an integer factor to >= size."""
+    has_alpha = frame.mode in ("RGBA", "LA", "PA") or "transparency" in frame.info
+    img = frame.convert("RGBA" if has_alpha else "RGB")
+    factor = min(img.size) // size
+    if factor > 1:
+        img = img.reduce(factor)
+    if has_alpha:
+        flat = Image.new("RGB", img.size, (0, 0, 0))
+        flat.paste(img, mask=img.getchannel("A"))
+        img = flat
+    return img
+
+
+def fit(frame, crop=False):
+    """Scale a frame to SIZE x SIZE: letterboxed, or centre-cropped with crop."""
+    img = _reduced(frame, SIZE)
+    if crop:
+        return ImageOps.fit(img, (SIZE, SIZE), Image.LANCZOS)
+    return ImageOps.pad(img, (SIZE, SIZE), Image.LANCZOS, color=(0, 0, 0))
+
+
+def _signature(frame):
+    img = _reduced(frame, SIGNATURE).resize((SIGNATURE, SIGNATURE), Image.BOX)
+    return np.asarray(img, dtype=np.float32)
+
+
+def plan_slots(segments, max_frames=MAX_FRAMES):
+    """Resample (first frame, duration_ms) segments onto a uniform clock.
+
+    The clock ticks at the shortest segment's duration, slowed down until
+    the loop fits in max_frames. Each output frame shows the segment
+    visible at the middle of its tick. Returns (speed_ms, slots): slots is
+    the source frame index per output frame, in order.
+    """
+    if len(segments) == 1:
+        return None, [segments[0][0]]
+    total = sum(duration for _, duration in segments)
+    speed = max(min(duration for _, duration in segments), total / max_frames)
+    count = max(1, min(max_frames, round(total / speed)))
+    speed = total / count
+    ends = np.cumsum([duration for _, duration in segments]).tolist()
+    slots = [segments[bisect.bisect_right(ends, (k + 0.5) * speed)][0]
+             for k in range(count)]
+    return round(speed), slots
+
+
+def scan(path, max_frames=MAX_FRAMES, threshold=DUPLICATE_THRESHOLD):
+    """Plan an import: which source frames to send, and at what PicSpeed.
+
+    Consecutive frames whose signatures differ from the first frame of
+    their run by at most threshold anywhere are merged into one segment.
+    Returns {"format", "size", "source_frames", "duration_ms", "segments",
+    "speed_ms", "slots"}; speed_ms is None for a still image.
+    """
+    segments = []
+    head = None
+    with Image.open(path) as img:
+        fmt, size = img.format, img.size
+        count = 0
+        for index, frame in enumerate(ImageSequence.Iterator(_draft(img))):
+            count += 1
+            signature = _signature(frame)
+            if head is not None and np.abs(signature - head).max() <= threshold:
+                segments[-1][1] += _duration(frame)
+            else:
+                segments.append([index, _duration(frame)])
+                head = signature
+    speed_ms, slots = plan_slots(segments, max_frames)
+    return {
+        "format": fmt,
+        "size": size,
+        "source_frames": count,
+        "duration_ms": sum(duration for _, duration in segments),
+        "segments": [tuple(segment) for segment in segments],
+        "speed_ms": speed_ms,
+        "slots": slots,
+    }
+
+
+def _runs(path, plan, crop=False):
+    """Yield (frame, repeats) for each distinct planned frame, in order."""
+    repeats = {}
+    for index in plan["slots"]:
+        repeats[index] = repeats.get(index, 0) + 1
+    last = plan["slots"][-1]
+    with Image.open(path) as img:
+        for index, frame in enumerate(ImageSequence.Iterator(_draft(img))):
+            if index in repeats:
+                yield fit(frame, crop), repeats[index]
+            if index >= last:
+                break
+
+
+def iter_frames(path, plan=None, crop=False):
+    """Yield the planned SIZE x SIZE frames one at a time (scan()s if no plan)."""
+    plan = plan or scan(path)
+    for frame, repeats in _runs(path, plan, crop):
+        for _ in range(repeats):
+            yield frame
+
+
+def iter_picdata(path, plan=None, crop=False, **encode_opts):
+    """Yield PicData per planned frame; repeated frames are encoded once.
+
+    Decoding and encoding run ahead of the consumer via encode_frames().
+    """
+    from divoom_client import encode_frames
+
+    plan = plan or scan(path)
+    counts = []
+
+    def distinct():
+        for frame, repeats in _runs(path, plan, crop):
+            counts.append(repeats)
+            yield frame
+
+    for i, data in enumerate(encode_frames(distinct(), **encode_opts)):
+        for _ in range(counts[i]):
+            yield data
+
+
+def send_import(path, screens, plan=None, crop=False, client=None):
+    """Send a file to a screen or screens. Returns (ok, pic_id, picdata)."""
+    from divoom_client import command_ok, new_pic_id, send_to_screen, send_animation
+
+    plan = plan or scan(path)
+    picdata = []
+
+    def keep():
+        for data in iter_picdata(path, plan, crop):
+            picdata.append(data)
+            yield data
+
+    animated = plan["speed_ms"] is not None
+    pic_id = new_pic_id(screens, animated)
+    if animated:
+        result = send_animation(screens, keep(), speed_ms=plan["speed_ms"], client=client,
+                                num_frames=len(plan["slots"]), pic_id=pic_id)
+        return result["ok"], result["pic_id"], picdata
+    ok = command_ok(send_to_screen(screens, next(keep()), client, pic_id=pic_id))
+    return ok, pic_id, picdata
+
+
+def print_plan(path, plan):
+    print(f"{path}: {plan['format']} {plan['size'][0]}x{plan['size'][1]}, "
+          f"{plan['source_frames']} frames, {plan['duration_ms']} ms loop, "
+          f"{len(plan['segments'])} distinct")
+    if plan["speed_ms"] is None:
+        print("  -> still image")
+    else:
+        print(f"  -> {len(plan['slots'])} frames at {plan['speed_ms']} ms "
+              f"({len(set(plan['slots']))} distinct)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import an animated image for the Times Gate")
+    parser.add_argument("file", help="GIF, WebP, APNG or still image")
+    parser.add_argument("screens", nargs="*", help="Screen numbers (0-4)")
+    parser.add_argument("--crop", action="store_true",
+                        help="Fill the screen, cropping the longer side (default: letterbox)")
+    parser.add_argument("--max-frames", type=int, default=MAX_FRAMES,
+                        help=f"Most frames to send (default {MAX_FRAMES}, the device limit)")
+    parser.add_argument("--threshold", type=float, default=DUPLICATE_THRESHOLD,
+                        help="Largest pixel difference (0-255) treated as a duplicate frame")
+    parser.add_argument("--info", action="store_true", help="Only show the import plan")
+    parser.add_argument("--bundle", default=None,
+                        help="Write a divoom_bundle.py bundle instead of sending")
+    args = parser.parse_args(argv)
+
+    try:
+        screens = [int(s) for s in args.screens]
+    except ValueError:
+        print(f"Error: Screens must be 0-4, got {' '.join(args.screens)}")
+        sys.exit(1)
+    for screen_id in screens:
+        if not 0 <= screen_id <= 4:
+            print(f"Error: Screen must be 0-4, got {screen_id}")
+            sys.exit(1)
+    if not (screens or args.info or args.bundle):
+        parser.error("give screens to send to, --info or --bundle")
+
+    start = time.perf_counter()
+    try:
+        plan = scan(args.file, max(1, args.max_frames), args.threshold)
+    except (OSError, ValueError) as e:
+        print(f"Error: cannot read {args.file}: {e}")
+        sys.exit(1)
+    print_plan(args.file, plan)
+    print(f"  scanned in {time.perf_counter() - start:.3f}s")
+    label = f"import:{os.path.basename(args.file)}"
+
+    if args.bundle:
+        from divoom_bundle import write_bundle
+        write_bundle(args.bundle, iter_picdata(args.file, plan, args.crop),
+                     plan["speed_ms"], label=label)
+        print(f"  wrote {args.bundle} ({os.path.getsize(args.bundle) / 1024:.1f} KB)")
+    if not screens:
+        return
+
+    from divoom_client import DEVICE_IP, send_command
+    from divoom_state import ScreenState, content_hash
+
+    send_command({"Command": "Draw/ResetHttpGifId"})
+    ok, pic_id, picdata = send_import(args.file, screens, plan, args.crop)
+    # Record what the screens show now, so a later apply of a theme resends it
+    state = ScreenState(DEVICE_IP)
+    for screen_id in screens:
+        if ok:
+            state.record(screen_id, content_hash(picdata, plan["speed_ms"]), pic_id, label)
+        else:
+            state.forget([screen_id])
+    state.save()
+    print(f"  sent in {time.perf_counter() - start:.3f}s total")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
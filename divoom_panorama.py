@@ -0,0 +1,118 @@
+"""
+Divoom Times Gate panorama mode.
+Draws one 640x128 canvas per frame spanning all five screens, then splits it
+into per-screen 128x128 frames. The splits are NumPy views of the canvas,
+so slicing copies nothing; the 5 x N tiles are JPEG-encoded in a thread pool
+and each screen is uploaded through send_animation.
+"""
+
+import random
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from divoom_client import command_ok, new_pic_id, send_animation, send_to_screen
+from divoom_erik import SIZE, Scene, draw_text_glow, frame_to_picdata, get_font
+
+SCREENS = 5
+WIDTH = SIZE * SCREENS
+
+
+def slice_panorama(canvas):
+    """Split a WIDTH x SIZE canvas (PIL image or array) into per-screen views."""
+    pixels = np.asarray(canvas)
+    return [pixels[:, i * SIZE:(i + 1) * SIZE] for i in range(SCREENS)]
+
+
+def encode_panorama(canvases, workers=None, **encode_opts):
+    """Encode panorama frames into one PicData list per screen.
+
+    Every (frame, screen) tile is encoded independently in a thread pool
+    (Pillow releases the GIL while encoding); results keep frame order.
+    encode_opts are passed to image_to_picdata.
+    """
+    tiles = [tile for canvas in canvases for tile in slice_panorama(canvas)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        picdata = list(pool.map(partial(frame_to_picdata, **encode_opts), tiles))
+    return [picdata[screen::SCREENS] for screen in range(SCREENS)]
+
+
+def send_panorama(picdata, speed_ms=200, screens=None, client=None):
+    """Upload per-screen PicData lists from encode_panorama().
+
+    screens limits the upload to those screen ids (default: all five).
+    Returns [{"screen", "pic_id", "ok"}] per screen sent.
+    """
+    results = []
+    for screen_id in range(SCREENS) if screens is None else screens:
+        frames = picdata[screen_id]
+        if len(frames) == 1:
+            pic_id = new_pic_id(screen_id)
+            ok = command_ok(send_to_screen(screen_id, frames[0], client, pic_id=pic_id))
+        else:
+            result = send_animation(screen_id, frames, speed_ms=speed_ms, client=client)
+            ok, pic_id = result["ok"], result["pic_id"]
+        results.append({"screen": screen_id, "pic_id": pic_id, "ok": ok})
+    return results
+
+
+# ==============================================================================
+# Skyline: night city continuing across all screens, scrolling name banner
+# ==============================================================================
+def make_panorama_skyline(num_frames=20):
+    return list(iter_panorama_skyline(num_frames))
+
+
+def iter_panorama_skyline(num_frames=20):
+    """Yield WIDTH x SIZE skyline canvases one at a time."""
+    rng = random.Random(11)
+
+    # Sky gradient and stars, drawn once
+    t = np.linspace(0, 1, SIZE)[:, None]
+    sky = (np.array([8, 6, 30]) * (1 - t) + np.array([60, 20, 70]) * t)
+    pixels = np.repeat(sky[:, None, :], WIDTH, axis=1).astype(np.uint8)
+    for _ in range(220):
+        x, y = rng.randrange(WIDTH), rng.randrange(70)
+        pixels[y, x] = rng.choice([(255, 255, 255), (200, 210, 255), (255, 230, 200)])
+    sky = Image.fromarray(pixels)
+    draw = ImageDraw.Draw(sky)
+    draw.ellipse([420, 44, 444, 68], fill=(245, 240, 210))
+    draw.ellipse([428, 41, 452, 65], fill=tuple(pixels[44, 460]))
+
+    # One continuous skyline, so buildings straddle screen edges
+    windows = []
+    x = 0
+    while x < WIDTH:
+        w = rng.randint(14, 34)
+        top = SIZE - rng.randint(30, 80)
+        draw.rectangle([x, top, x + w - 1, SIZE - 1], fill=(10, 10, 24))
+        for wy in range(top + 4, SIZE - 6, 7):
+            for wx in range(x + 3, x + w - 4, 6):
+                windows.append((wx, wy))
+        x += w + rng.randint(0, 3)
+
+    def lit_windows(img, frame_idx):
+        frame_rng = random.Random(frame_idx * 31 + 7)
+        draw = ImageDraw.Draw(img)
+        for wx, wy in windows:
+            if frame_rng.random() < 0.35:
+                draw.rectangle([wx, wy, wx + 2, wy + 3], fill=(255, 210, 110))
+
+    font = get_font("bold", 30)
+    text = "ERIK SALO"
+
+    def banner(img, frame_idx):
+        # Scroll right to left and wrap, so the loop is seamless
+        x = WIDTH - frame_idx * WIDTH // num_frames
+        draw = ImageDraw.Draw(img)
+        for offset in (x - WIDTH, x):
+            draw_text_glow(draw, (offset, 8), text, font, (255, 255, 255),
+                           [(4, (120, 0, 160)), (2, (255, 60, 200))])
+
+    scene = Scene(size=(WIDTH, SIZE))
+    scene.opaque(sky)
+    scene.dynamic(lit_windows)
+    scene.dynamic(banner)
+    yield from scene.frames(num_frames)
@@ -0,0 +1,91 @@
+"""
+Divoom Times Gate theme registry.
+Theme names, aliases, animation settings and the default screen layout.
+Generators are referenced by name and only imported when a theme is
+rendered, so listing themes or resolving aliases needs no PIL or NumPy.
+"""
+
+import importlib
+
+# Module holding the make/stream functions named below; stream functions
+# take (num_frames, workers) and yield frames in order
+GENERATOR_MODULE = "divoom_erik"
+
+THEMES = {
+    "synthwave": {
+        "description": "Retro synthwave: neon sun, perspective grid floor, cyan/magenta glow text",
+        "aliases": ["neon", "retro", "vaporwave", "80s", "grid", "outrun"],
+        "animated": False,
+        "make": "make_screen_neon",
+    },
+    "nebula": {
+        "description": "Cosmic nebula: colorful gas clouds, bright starfield, rainbow letters",
+        "aliases": ["cosmic", "space", "galaxy", "stars", "arcade"],
+        "animated": False,
+        "make": "make_screen_arcade",
+    },
+    "gold": {
+        "description": "Art deco gold: sunburst rays on purple, diamond shapes, ornamental frame",
+        "aliases": ["artdeco", "elegant", "royal", "fancy", "purple", "deco"],
+        "animated": False,
+        "make": "make_screen_gold",
+    },
+    "matrix": {
+        "description": "Matrix city: green rain, city skyline silhouette, flickering windows",
+        "aliases": ["cyber", "hacker", "code", "rain", "city", "digital", "green"],
+        "animated": True,
+        "make": "make_screen_matrix",
+        "stream": "iter_screen_matrix",
+        "frames": 10,
+        "speed_ms": 300,
+    },
+    "fire": {
+        "description": "Volcanic fire: lava cracks, floating embers, smoke, flames",
+        "aliases": ["volcano", "lava", "flames", "inferno", "volcanic", "ember"],
+        "animated": True,
+        "make": "make_screen_fire",
+        "stream": "iter_screen_fire",
+        "frames": 10,
+        "speed_ms": 250,
+    },
+}
+
+# Panoramas: one 640x128 canvas sliced across all five screens
+PANORAMAS = {
+    "skyline": {
+        "description": "Night city skyline continuing across all screens, scrolling name banner",
+        "aliases": ["panorama", "banner", "citynight"],
+        "animated": True,
+        "module": "divoom_panorama",
+        "make": "make_panorama_skyline",
+        "frames": 20,
+        "speed_ms": 150,
+    },
+}
+
+# Default layout: which theme goes on which screen (0-4 left to right)
+DEFAULT_LAYOUT = [
+    ("synthwave", 0),
+    ("nebula", 1),
+    ("gold", 2),
+    ("matrix", 3),
+    ("fire", 4),
+]
+
+
+def resolve_theme(name, registry=THEMES):
+    """Resolve a theme by name or alias. Returns canonical theme name or None."""
+    name = name.lower().strip()
+    if name in registry:
+        return name
+    for theme_name, info in registry.items():
+        if name in info["aliases"]:
+            return theme_name
+    return None
+
+
+def generator(theme_name, kind="make", registry=THEMES):
+    """Import and return a theme's "make" (or "stream") function."""
+    info = registry[theme_name]
+    module = importlib.import_module(info.get("module", GENERATOR_MODULE))
+    return getattr(module, info[kind])
@@ -0,0 +1,79 @@
+"""
+Divoom Times Gate screen state.
+Local record of what each screen is currently showing (a content hash and
+the PicID it was sent under), so layouts can resend only the screens whose
+rendered content actually changed.
+
+The device cannot be queried for this, so the record only knows what this
+machine sent; use --force (or ScreenState.forget) after anything else has
+drawn on the screens.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+STATE_FILE = os.environ.get(
+    "DIVOOM_STATE_FILE",
+    os.path.join(os.path.expanduser("~"), ".cache", "divoom_screens.json"),
+)
+
+
+def content_hash(picdata, speed_ms=None):
+    """Hash of a screen's encoded frames and frame timing."""
+    h = hashlib.sha256(str(speed_ms).encode("ascii"))
+    for frame in picdata:
+        h.update(b"\0")
+        h.update(frame.encode("ascii"))
+    return h.hexdigest()[:32]
+
+
+class ScreenState:
+    """Per-device, per-screen record of the last content sent."""
+
+    def __init__(self, device, path=STATE_FILE):
+        self.device = device
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.screens = json.load(f).get(device, {})
+        except (OSError, ValueError):
+            self.screens = {}
+
+    def current(self, screen_id):
+        """Record for a screen ({"hash", "pic_id", "label", "time"}) or None."""
+        return self.screens.get(str(screen_id))
+
+    def changed(self, screen_id, digest):
+        entry = self.current(screen_id)
+        return entry is None or entry["hash"] != digest
+
+    def record(self, screen_id, digest, pic_id, label=None):
+        self.screens[str(screen_id)] = {
+            "hash": digest, "pic_id": pic_id, "label": label,
+            "time": int(time.time()),
+        }
+
+    def forget(self, screen_ids=None):
+        """Drop records so the next apply resends those screens (default: all)."""
+        if screen_ids is None:
+            self.screens.clear()
+        for screen_id in screen_ids or []:
+            self.screens.pop(str(screen_id), None)
+
+    def save(self):
+        """Write this device's records, keeping other devices' as on disk."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                all_devices = json.load(f)
+        except (OSError, ValueError):
+            all_devices = {}
+        all_devices[self.device] = self.screens
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".state-", dir=directory)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(all_devices, f, indent=2)
+        os.replace(tmp, self.path)
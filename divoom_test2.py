@@ -2,26 +2,20 @@
 Divoom Times Gate - Fixed test with JPEG encoding at 128x128
 """
 
-import requests
 import base64
 import time
 import io
 from PIL import Image, ImageDraw, ImageFont
+from divoom_client import DivoomClient
 
 DEVICE_IP = "10.0.0.21"
-URL = f"http://{DEVICE_IP}/post"
 SIZE = 128
 
+client = DivoomClient(DEVICE_IP)
+
 
 def send_command(payload):
-    try:
-        r = requests.post(URL, json=payload, timeout=8)
-        data = r.json()
-        print(f"  -> {data}")
-        return data
-    except Exception as e:
-        print(f"  -> Error: {e}")
-        return None
+    return client.send_command(payload)
 
 
 def image_to_picdata(img):
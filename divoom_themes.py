@@ -5,9 +5,19 @@ CLI for applying named themes to individual screens.
 
 Usage:
     python divoom_themes.py list
-    python divoom_themes.py apply <theme> <screen>
-    python divoom_themes.py apply-all
+    python divoom_themes.py apply <theme> <screen> [<screen>...]
+    python divoom_themes.py apply <theme> all
+    python divoom_themes.py apply-all [--parallel [--jobs N]]
+    python divoom_themes.py apply-all --devices IP[,IP...]
+    python divoom_themes.py apply-panorama <panorama>
     python divoom_themes.py brightness <0-100>
+
+Rendered themes are cached on disk (see divoom_cache.py); pass --no-cache
+to force a fresh render. Screens already showing the same content are
+skipped (see divoom_state.py); pass --force to resend them.
+--frame-kb / --anim-kb / --min-psnr switch JPEG encoding to a per-frame or
+per-animation byte budget. --frame-jobs N renders the frames of each
+animated theme in N processes.
 """
 
 import sys
@@ -17,83 +27,264 @@ import time
 
 # Ensure we can import from the same directory regardless of cwd
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-from divoom_erik import (
-    send_command, send_to_screen, send_animation,
-    make_screen_neon, make_screen_arcade, make_screen_gold,
-    make_screen_matrix, make_screen_fire,
-)
-
-THEMES = {
-    "synthwave": {
-        "description": "Retro synthwave: neon sun, perspective grid floor, cyan/magenta glow text",
-        "aliases": ["neon", "retro", "vaporwave", "80s", "grid", "outrun"],
-        "animated": False,
-        "make": make_screen_neon,
-    },
-    "nebula": {
-        "description": "Cosmic nebula: colorful gas clouds, bright starfield, rainbow letters",
-        "aliases": ["cosmic", "space", "galaxy", "stars", "arcade"],
-        "animated": False,
-        "make": make_screen_arcade,
-    },
-    "gold": {
-        "description": "Art deco gold: sunburst rays on purple, diamond shapes, ornamental frame",
-        "aliases": ["artdeco", "elegant", "royal", "fancy", "purple", "deco"],
-        "animated": False,
-        "make": make_screen_gold,
-    },
-    "matrix": {
-        "description": "Matrix city: green rain, city skyline silhouette, flickering windows",
-        "aliases": ["cyber", "hacker", "code", "rain", "city", "digital", "green"],
-        "animated": True,
-        "make": make_screen_matrix,
-        "frames": 10,
-        "speed_ms": 300,
-    },
-    "fire": {
-        "description": "Volcanic fire: lava cracks, floating embers, smoke, flames",
-        "aliases": ["volcano", "lava", "flames", "inferno", "volcanic", "ember"],
-        "animated": True,
-        "make": make_screen_fire,
-        "frames": 10,
-        "speed_ms": 250,
-    },
-}
-
-# Default layout: which theme goes on which screen (0-4 left to right)
-DEFAULT_LAYOUT = [
-    ("synthwave", 0),
-    ("nebula", 1),
-    ("gold", 2),
-    ("matrix", 3),
-    ("fire", 4),
-]
-
-
-def resolve_theme(name):
-    """Resolve a theme by name or alias. Returns canonical theme name or None."""
-    name = name.lower().strip()
-    if name in THEMES:
-        return name
-    for theme_name, info in THEMES.items():
-        if name in info["aliases"]:
-            return theme_name
-    return None
-
-
-def apply_theme(theme_name, screen_id):
-    """Generate and send a theme to a specific screen."""
+from divoom_registry import THEMES, PANORAMAS, DEFAULT_LAYOUT, resolve_theme, generator
+
+# Rendering, caching and device modules pull in PIL, NumPy and requests, so
+# they are imported inside the commands that need them: `list` and
+# `brightness` start without them (see `divoom_bench.py startup`).
+
+# Shared FrameCache for long-running processes (see divoom_daemon.py);
+# None means each command opens the on-disk cache itself
+frame_cache = None
+
+
+def _cache_key(theme_name, cache, encoding):
+    """Cache key (or None without a cache) and encode options for a theme.
+
+    The key includes the font files divoom_fonts resolves to, so changing
+    DIVOOM_FONT_PATH or installing fonts does not replay old renders.
+    """
     info = THEMES[theme_name]
-    print(f"Applying '{theme_name}' to screen {screen_id}...")
+    params = {"frames": info["frames"]} if info["animated"] else {}
+    encode_opts = _encode_opts(info, encoding)
+    params.update(encode_opts)
+    if cache is None:
+        return None, encode_opts
+    from divoom_fonts import resolved_paths
+
+    key = cache.key(theme_name, generator(theme_name), fonts=resolved_paths(), **params)
+    return key, encode_opts
+
+
+def cached_theme(theme_name, cache=None, encoding=None):
+    """Cached PicData list for a theme, or None if it has to be rendered."""
+    if cache is None:
+        return None
+    key, _ = _cache_key(theme_name, cache, encoding)
+    picdata = cache.get(key)
+    if picdata is not None:
+        print(f"  Using cached render of '{theme_name}'")
+    return picdata
+
+
+def stream_theme(theme_name, cache=None, encoding=None, frame_jobs=None):
+    """Yield a theme's PicData frame by frame.
+
+    Fresh renders run through the encode_frames() pipeline, so callers can
+    start sending before the last frame is drawn; they are written to the
+    cache once complete. Cached renders are replayed directly.
+    encoding is the budget dict from _encoding(), or None for the default.
+    frame_jobs > 1 renders an animation's frames in that many processes.
+    """
+    from divoom_client import encode_frames
+
+    picdata = cached_theme(theme_name, cache, encoding)
+    if picdata is not None:
+        yield from picdata
+        return
 
+    info = THEMES[theme_name]
+    key, encode_opts = _cache_key(theme_name, cache, encoding)
     if info["animated"]:
-        frames = info["make"](num_frames=info["frames"])
-        send_animation(screen_id, frames, speed_ms=info["speed_ms"])
+        frames = generator(theme_name, "stream")(num_frames=info["frames"],
+                                                 workers=frame_jobs)
     else:
-        img = info["make"]()
-        send_to_screen(screen_id, img)
+        frames = iter([generator(theme_name)()])
+    picdata = []
+    for data in encode_frames(frames, **encode_opts):
+        picdata.append(data)
+        yield data
+    if cache is not None:
+        cache.put(key, picdata)
+
 
-    print(f"  Done! Screen {screen_id} = {theme_name}")
+def _keep(items, kept):
+    for item in items:
+        kept.append(item)
+        yield item
+
+
+def _encode_opts(info, encoding):
+    """image_to_picdata options for one theme from a CLI encoding budget."""
+    from divoom_erik import frame_budget
+
+    if not encoding:
+        return {}
+    anim_bytes = encoding.get("anim_bytes") if info["animated"] else None
+    max_bytes = frame_budget(info.get("frames"), anim_bytes, encoding.get("frame_bytes"))
+    opts = {"max_bytes": max_bytes, "min_psnr": encoding.get("min_psnr")}
+    return {k: v for k, v in opts.items() if v is not None}
+
+
+def render_theme(theme_name, cache=None, encoding=None, frame_jobs=None):
+    """Render a theme and encode its frames. Returns a list of PicData strings."""
+    return list(stream_theme(theme_name, cache, encoding, frame_jobs))
+
+
+def send_theme(theme_name, screen_id, picdata):
+    """Send a rendered theme (a PicData list or stream) to a screen or screens.
+
+    screen_id may be a list; every listed screen gets the same upload via a
+    multi-bit LcdArray. Returns (ok, pic_id).
+    """
+    from divoom_client import command_ok, new_pic_id, send_to_screen, send_animation
+
+    info = THEMES[theme_name]
+    pic_id = new_pic_id(screen_id, info["animated"])
+    if info["animated"]:
+        result = send_animation(screen_id, picdata, speed_ms=info["speed_ms"],
+                                num_frames=info["frames"], pic_id=pic_id)
+        return result["ok"], result["pic_id"]
+    return command_ok(send_to_screen(screen_id, list(picdata)[0], pic_id=pic_id)), pic_id
+
+
+def _render_timed(theme_name, cache, encoding=None, frame_jobs=None):
+    """render_theme() plus its duration; runs in pool workers for apply-all."""
+    start = time.perf_counter()
+    picdata = render_theme(theme_name, cache, encoding, frame_jobs)
+    return picdata, time.perf_counter() - start
+
+
+def group_layout(layout):
+    """Group (theme, screen) pairs into [(theme, [screens])], first-seen order.
+
+    Themes render deterministically, so every screen showing the same theme
+    shares one render and one upload.
+    """
+    groups = {}
+    for theme_name, screen_id in layout:
+        screens = groups.setdefault(theme_name, [])
+        if screen_id not in screens:
+            screens.append(screen_id)
+    return list(groups.items())
+
+
+def apply_layout(layout, args):
+    """Render and send (theme, screen) pairs, skipping screens that are unchanged.
+
+    Screens sharing a theme are rendered once and sent as one upload with a
+    multi-screen LcdArray. Each screen's content hash is compared with the
+    local ScreenState record and only differing screens are included; the
+    GIF-ID reset is issued only if at least one upload goes out. A theme is
+    streamed straight to the device as it renders only when none of its
+    screens has a record (or with --force); otherwise it is rendered and
+    encoded in full (filling the cache) and compared first, since a cache
+    miss alone does not mean the content changed. With --parallel every theme is rendered at once in a
+    process pool and each one is sent as soon as its frames are ready;
+    otherwise --frame-jobs spreads each animation's frames over processes.
+    Screens whose upload fails lose their record, so they are resent next
+    time. Returns True if every upload succeeded.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from divoom_client import DEVICE_IP, get_client, screen_label, send_command
+    from divoom_state import ScreenState, content_hash
+
+    cache = _cache(args)
+    encoding = _encoding(args)
+    parallel = getattr(args, "parallel", False)
+    # Themes already render one per process with --parallel; don't nest pools
+    frame_jobs = None if parallel else args.frame_jobs
+    groups = group_layout(layout)
+    state = ScreenState(DEVICE_IP)
+    if args.force:
+        state.forget()
+    start = time.perf_counter()
+    timings = []
+    reset_sent = []
+
+    def send(theme_name, screens, picdata, render_s):
+        speed_ms = THEMES[theme_name].get("speed_ms")
+        if picdata is not None:
+            digest = content_hash(picdata, speed_ms)
+            unchanged = [s for s in screens if not state.changed(s, digest)]
+            for screen_id in unchanged:
+                print(f"Screen {screen_id} already shows '{theme_name}', skipping")
+            if unchanged:
+                timings.append((unchanged, theme_name, render_s, None, True))
+            screens = [s for s in screens if s not in unchanged]
+            if not screens:
+                return
+        if not reset_sent:
+            send_command({"Command": "Draw/ResetHttpGifId"})
+            reset_sent.append(True)
+
+        print(f"Applying '{theme_name}' to {screen_label(screens)}...")
+        send_start = time.perf_counter()
+        if picdata is None:
+            picdata = []
+            ok, pic_id = send_theme(theme_name, screens,
+                                    _keep(stream_theme(theme_name, cache, encoding, frame_jobs),
+                                          picdata))
+            digest = content_hash(picdata, speed_ms)
+        else:
+            ok, pic_id = send_theme(theme_name, screens, picdata)
+        timings.append((screens, theme_name, render_s, time.perf_counter() - send_start, ok))
+        for screen_id in screens:
+            if ok:
+                state.record(screen_id, digest, pic_id, theme_name)
+            else:
+                # The screen may be half-written; never let it count as unchanged
+                state.forget([screen_id])
+
+    if parallel:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            futures = {
+                pool.submit(_render_timed, theme_name, cache, encoding):
+                    (theme_name, screens)
+                for theme_name, screens in groups
+            }
+            for future in as_completed(futures):
+                picdata, render_s = future.result()
+                send(*futures[future], picdata, render_s)
+    else:
+        for theme_name, screens in groups:
+            picdata = cached_theme(theme_name, cache, encoding)
+            render_s = 0.0 if picdata is not None else None
+            # Nothing to compare against: start sending while it renders
+            recorded = any(state.current(s) is not None for s in screens)
+            if picdata is None and recorded:
+                picdata, render_s = _render_timed(theme_name, cache, encoding, frame_jobs)
+            send(theme_name, screens, picdata, render_s)
+    state.save()
+
+    total = time.perf_counter() - start
+    sent = [t for t in timings if t[3] is not None]
+    failed = [t for t in sent if not t[4]]
+    mode = "parallel" if parallel else "serial"
+    num_screens = sum(len(screens) for _, screens in groups)
+    print(f"\n{sum(len(t[0]) for t in sent if t[4])} of {num_screens} screens updated "
+          f"in {len(sent)} uploads ({mode})")
+    if failed:
+        print(f"  {sum(len(t[0]) for t in failed)} screens failed and will be resent next time")
+    print(f"  {'screens':>7s}  {'theme':12s} {'render':>8s} {'send':>8s}")
+    for screens, theme_name, render_s, send_s, ok in sorted(timings):
+        render_col = "streamed" if render_s is None else f"{render_s:7.3f}s"
+        send_col = "skipped" if send_s is None else f"{send_s:7.3f}s"
+        print(f"  {','.join(map(str, screens)):>7s}  {theme_name:12s} "
+              f"{render_col:>8s} {send_col:>8s}{'' if ok else '  FAILED'}")
+    print(f"  render total {sum(t[2] or 0 for t in timings):.3f}s (CPU across workers), "
+          f"send total {sum(t[3] for t in sent):.3f}s, wall clock {total:.3f}s")
+    if sent and get_client().flow:
+        print(f"  {get_client().flow.summary()}")
+    return not failed
+
+
+def _cache(args):
+    from divoom_cache import FrameCache
+
+    if args.no_cache:
+        return None
+    return frame_cache if frame_cache is not None else FrameCache()
+
+
+def _encoding(args):
+    """Adaptive JPEG budget from the CLI flags, or None for fixed quality."""
+    encoding = {
+        "frame_bytes": int(args.frame_kb * 1024) if args.frame_kb else None,
+        "anim_bytes": int(args.anim_kb * 1024) if args.anim_kb else None,
+        "min_psnr": args.min_psnr,
+    }
+    return encoding if any(v is not None for v in encoding.values()) else None
 
 
 def cmd_list(args):
@@ -105,74 +296,221 @@ def cmd_list(args):
         print(f"  {name:12s}{anim}")
         print(f"    {info['description']}")
         print(f"    aliases: {aliases}\n")
+    print("Panoramas (one image across all 5 screens, apply-panorama):\n")
+    for name, info in PANORAMAS.items():
+        print(f"  {name:12s} (animated)")
+        print(f"    {info['description']}")
+        print(f"    aliases: {', '.join(info['aliases'])}\n")
     print("Screens are numbered 0-4 (left to right).")
     print("Default layout: " + ", ".join(f"{s}={t}" for t, s in DEFAULT_LAYOUT))
 
 
 def cmd_apply(args):
-    """Apply a theme to a screen."""
+    """Apply a theme to one or more screens (one upload for all of them)."""
     theme = resolve_theme(args.theme)
     if theme is None:
         print(f"Error: Unknown theme '{args.theme}'")
         print(f"Available: {', '.join(THEMES.keys())}")
         sys.exit(1)
-    if not 0 <= args.screen <= 4:
-        print(f"Error: Screen must be 0-4, got {args.screen}")
+    if [s.lower() for s in args.screens] == ["all"]:
+        screens = list(range(5))
+    else:
+        try:
+            screens = [int(s) for s in args.screens]
+        except ValueError:
+            print(f"Error: Screens must be 0-4 or 'all', got {' '.join(args.screens)}")
+            sys.exit(1)
+    for screen_id in screens:
+        if not 0 <= screen_id <= 4:
+            print(f"Error: Screen must be 0-4, got {screen_id}")
+            sys.exit(1)
+
+    if not apply_layout([(theme, screen_id) for screen_id in screens], args):
         sys.exit(1)
 
-    send_command({"Command": "Draw/ResetHttpGifId"})
-    time.sleep(0.3)
-    apply_theme(theme, args.screen)
-
 
 def cmd_apply_all(args):
     """Apply the default 5-theme layout to all screens."""
+    if args.devices:
+        return _apply_all_devices(args)
     print("Applying default layout to all 5 screens...")
-    send_command({"Command": "Draw/ResetHttpGifId"})
-    time.sleep(0.3)
+    if not apply_layout(DEFAULT_LAYOUT, args):
+        sys.exit(1)
 
-    for theme_name, screen_id in DEFAULT_LAYOUT:
-        apply_theme(theme_name, screen_id)
-        time.sleep(0.3)
 
-    print("\nAll 5 screens updated!")
+def _apply_all_devices(args):
+    """Render the default layout once and push it to several devices at once.
+
+    Each device has its own ScreenState, so every device only receives the
+    screens that differ from what it was last sent; screens sharing a theme
+    go out as one multi-screen upload.
+    """
+    import asyncio
+    from divoom_async import fan_out
+    from divoom_state import ScreenState, content_hash
+
+    ips = [ip.strip() for ip in args.devices.split(",") if ip.strip()]
+    print(f"Applying default layout to {len(ips)} devices...")
+    cache = _cache(args)
+    encoding = _encoding(args)
+    start = time.perf_counter()
+    rendered = []
+    for theme_name, screens in group_layout(DEFAULT_LAYOUT):
+        picdata = render_theme(theme_name, cache, encoding, args.frame_jobs)
+        speed_ms = THEMES[theme_name].get("speed_ms")
+        rendered.append((theme_name, screens, picdata, speed_ms,
+                         content_hash(picdata, speed_ms)))
+    render_done = time.perf_counter()
+
+    states, layouts, digests = {}, {}, {}
+    for ip in ips:
+        states[ip] = state = ScreenState(ip)
+        if args.force:
+            state.forget()
+        layouts[ip] = []
+        for theme_name, screens, picdata, speed_ms, digest in rendered:
+            changed = [s for s in screens if state.changed(s, digest)]
+            if changed:
+                layouts[ip].append((changed, picdata, speed_ms or 1000))
+            for screen_id in screens:
+                digests[screen_id] = (theme_name, digest)
+    results = asyncio.run(fan_out(ips, layouts))
+    done = time.perf_counter()
+
+    failed = 0
+    for ip, uploads in results.items():
+        for result in uploads:
+            for screen_id in result["screens"]:
+                if result["ok"]:
+                    theme_name, digest = digests[screen_id]
+                    states[ip].record(screen_id, digest, result["pic_id"], theme_name)
+                else:
+                    states[ip].forget([screen_id])
+        states[ip].save()
+        sent = sum(len(result["screens"]) for result in uploads if result["ok"])
+        lost = sum(len(result["screens"]) for result in uploads if not result["ok"])
+        failed += lost
+        print(f"  {ip}: {sent} of {len(digests)} screens sent in {len(uploads)} uploads"
+              + (f", {lost} failed" if lost else ""))
+    print(f"  render {render_done - start:.3f}s, send {done - render_done:.3f}s "
+          f"to {len(ips)} devices, wall clock {done - start:.3f}s")
+    if failed:
+        sys.exit(1)
+
+
+def cmd_apply_panorama(args):
+    """Render a panorama once, slice it across all screens and send the changed ones."""
+    name = resolve_theme(args.panorama, PANORAMAS)
+    if name is None:
+        print(f"Error: Unknown panorama '{args.panorama}'")
+        print(f"Available: {', '.join(PANORAMAS.keys())}")
+        sys.exit(1)
+    from divoom_client import DEVICE_IP, get_client, send_command
+    from divoom_panorama import encode_panorama, send_panorama
+    from divoom_state import ScreenState, content_hash
+
+    info = PANORAMAS[name]
+    start = time.perf_counter()
+    canvases = generator(name, registry=PANORAMAS)(num_frames=info["frames"])
+    rendered = time.perf_counter()
+    picdata = encode_panorama(canvases, workers=args.jobs,
+                              **_encode_opts(info, _encoding(args)))
+    encoded = time.perf_counter()
+
+    state = ScreenState(DEVICE_IP)
+    if args.force:
+        state.forget()
+    digests = [content_hash(frames, info["speed_ms"]) for frames in picdata]
+    screens = [s for s, digest in enumerate(digests) if state.changed(s, digest)]
+    updated = 0
+    if screens:
+        print(f"Applying panorama '{name}' to {len(screens)} screens...")
+        send_command({"Command": "Draw/ResetHttpGifId"})
+        for result in send_panorama(picdata, info["speed_ms"], screens):
+            if result["ok"]:
+                state.record(result["screen"], digests[result["screen"]],
+                             result["pic_id"], f"panorama:{name}")
+                updated += 1
+            else:
+                state.forget([result["screen"]])
+        state.save()
+    done = time.perf_counter()
+    print(f"\n{updated} of 5 screens updated with panorama '{name}'")
+    if updated < len(screens):
+        print(f"  {len(screens) - updated} screens failed and will be resent next time")
+    print(f"  render {rendered - start:.3f}s ({info['frames']} canvases), "
+          f"encode {encoded - rendered:.3f}s ({5 * info['frames']} tiles), "
+          f"send {done - encoded:.3f}s")
+    if screens and get_client().flow:
+        print(f"  {get_client().flow.summary()}")
+    if updated < len(screens):
+        sys.exit(1)
 
 
 def cmd_brightness(args):
     """Set display brightness."""
+    from divoom_client import send_command
+
     level = max(0, min(100, args.level))
     print(f"Setting brightness to {level}%...")
     send_command({"Command": "Channel/SetBrightness", "Brightness": level})
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description="Divoom Times Gate Theme Controller",
         epilog="Themes: " + ", ".join(THEMES.keys()),
     )
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignore the rendered-frame cache and render from scratch")
+    parser.add_argument("--force", action="store_true",
+                        help="Resend every screen even if its content is unchanged")
+    parser.add_argument("--frame-kb", type=float, default=None,
+                        help="Max base64 PicData size per frame, in KB")
+    parser.add_argument("--anim-kb", type=float, default=None,
+                        help="Max total PicData size per animation, in KB")
+    parser.add_argument("--min-psnr", type=float, default=None,
+                        help="Lowest acceptable JPEG quality in dB PSNR")
+    parser.add_argument("--frame-jobs", type=int, default=None,
+                        help="Worker processes rendering each animation's frames")
     sub = parser.add_subparsers(dest="command", required=True)
 
     # list
     sub.add_parser("list", help="List available themes")
 
-    # apply <theme> <screen>
-    p_apply = sub.add_parser("apply", help="Apply a theme to a screen")
+    # apply <theme> <screen> [<screen>...]
+    p_apply = sub.add_parser("apply", help="Apply a theme to one or more screens")
     p_apply.add_argument("theme", help="Theme name or alias")
-    p_apply.add_argument("screen", type=int, help="Screen number (0-4)")
+    p_apply.add_argument("screens", nargs="+",
+                         help="Screen numbers (0-4), or 'all' for every screen")
 
     # apply-all
-    sub.add_parser("apply-all", help="Apply default layout to all screens")
+    p_all = sub.add_parser("apply-all", help="Apply default layout to all screens")
+    p_all.add_argument("--parallel", action="store_true",
+                       help="Render all screens at once in a process pool")
+    p_all.add_argument("--jobs", type=int, default=None,
+                       help="Worker processes for --parallel (default: CPU count)")
+    p_all.add_argument("--devices", default=None,
+                       help="Comma-separated device IPs to update concurrently")
+
+    # apply-panorama <panorama>
+    p_pano = sub.add_parser("apply-panorama",
+                            help="Render one panorama across all five screens")
+    p_pano.add_argument("panorama", help="Panorama name or alias")
+    p_pano.add_argument("--jobs", type=int, default=None,
+                        help="Encoder threads (default: Python's thread pool size)")
 
     # brightness <level>
     p_bright = sub.add_parser("brightness", help="Set brightness (0-100)")
     p_bright.add_argument("level", type=int, help="Brightness level 0-100")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     commands = {
         "list": cmd_list,
         "apply": cmd_apply,
         "apply-all": cmd_apply_all,
+        "apply-panorama": cmd_apply_panorama,
         "brightness": cmd_brightness,
     }
     commands[args.command](args)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Fake Divoom Times Gate for offline testing.
+Speaks the device's HTTP/1.1 keep-alive `/post` JSON API, records every
+command it receives and replies {"error_code": 0}. With --min-interval it
+behaves like an overloaded device: commands that arrive sooner than that
+after the previous reply are answered slowly and with an error.
+
+Usage:
+    python fake_device.py [--port 8080] [--latency 0.05] [--min-interval 0.1]
+
+From Python:
+    with FakeDevice(latency=0.02) as dev:
+        client = DivoomClient(dev.ip)
+        ...
+        dev.commands  # every payload received, in order
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class FakeDevice:
+    """Local stand-in for a Times Gate.
+
+    latency          - seconds to wait before answering each command
+    min_interval     - commands closer than this to the previous reply overload it
+    overload_latency - extra seconds an overloaded command takes to answer
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, min_interval=0.0,
+                 overload_latency=0.2):
+        self.latency = latency
+        self.min_interval = min_interval
+        self.overload_latency = overload_latency
+        self.overloads = 0
+        self._last_reply = 0.0
+        self.commands = []
+        self.connections = set()
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def ip(self):
+        """host:port string usable wherever a device IP is expected."""
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def respond(self, payload):
+        """Build the reply for one command. Override to simulate behaviour."""
+        overloaded = time.monotonic() - self._last_reply < self.min_interval
+        time.sleep(self.latency + (self.overload_latency if overloaded else 0))
+        self._last_reply = time.monotonic()
+        if overloaded:
+            self.overloads += 1
+            return {"error_code": 1, "error_message": "device busy"}
+        return {"error_code": 0}
+
+    def _handler_class(self):
+        device = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    payload = None
+                with device._lock:
+                    device.commands.append(payload)
+                    device.connections.add(self.client_address)
+                reply = device.respond(payload)
+                body = json.dumps(reply).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Divoom Times Gate")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds to wait before answering each command")
+    parser.add_argument("--min-interval", type=float, default=0.0,
+                        help="Overload on commands sent sooner than this after a reply")
+    args = parser.parse_args()
+
+    device = FakeDevice(args.host, args.port, latency=args.latency,
+                        min_interval=args.min_interval)
+    print(f"Fake Times Gate listening on http://{device.ip}/post")
+    try:
+        device.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        device.server.server_close()
+        print(f"Received {len(device.commands)} commands")
+
+
+if __name__ == "__main__":
+    main()